@@ -6,14 +6,26 @@ from pathlib import Path
 from flask import Flask, redirect
 from config import Config
 from db import init_db
+from catalog_cache import init_catalog_cache
+from images import init_images
+from uploads import init_uploads
+from jobs import init_jobs
+from sales import init_sales
+from benchmarks import init_benchmarks
 
 # Create upload folders if not exist (Windows-safe)
-for folder in ('static/uploads', 'static/uploads/crops', 'static/uploads/products'):
+for folder in ('static/uploads', 'static/uploads/crops', 'static/uploads/products', 'static/uploads/objects'):
     Path(folder).mkdir(parents=True, exist_ok=True)
 
 app = Flask(__name__)
 app.config.from_object(Config)
 init_db(app)
+init_catalog_cache(app)
+init_images(app)
+init_uploads(app)
+init_jobs(app)
+init_sales(app)
+init_benchmarks(app)
 
 # Register blueprints
 from routes.auth import auth_bp
@@ -23,6 +35,7 @@ from routes.crops import crops_bp
 from routes.schemes import schemes_bp
 from routes.store import store_bp
 from routes.financial import financial_bp
+from routes.search import search_bp
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(farmer_bp, url_prefix='/farmer')
@@ -31,6 +44,7 @@ app.register_blueprint(crops_bp, url_prefix='/crops')
 app.register_blueprint(schemes_bp, url_prefix='/schemes')
 app.register_blueprint(store_bp, url_prefix='/store')
 app.register_blueprint(financial_bp, url_prefix='/financial')
+app.register_blueprint(search_bp, url_prefix='/search')
 
 @app.route('/')
 def index():
@@ -0,0 +1,185 @@
+# FarmIntel - District benchmarks: percentiles of cost/acre, yield/acre and margin per district, crop and season
+import logging
+import time
+import click
+from config import Config
+import db
+from db_stats import InstrumentedSSCursor
+import jobs
+
+try:
+    import numpy as np
+except ImportError:  # numpy missing: benchmarks are not computed and the dashboard shows none
+    np = None
+
+logger = logging.getLogger('farmintel.benchmarks')
+
+SEASONS = ('Kharif', 'Rabi', 'Zaid')
+QUANTILES = (0.25, 0.5, 0.75)
+METRICS = ('cost', 'yield', 'margin')  # cost per acre (₹), yield per acre, net profit as % of income
+_LOCK = 'farmintel.benchmarks'
+_next_check = 0.0
+
+def key(text):
+    """Grouping key for districts and crop names: trimmed, single-spaced, lower-case."""
+    return ' '.join((text or '').split()).lower()
+
+def season_key(season):
+    """'Kharif 2024' -> 'Kharif'; '' when the record's season names none of SEASONS."""
+    text = (season or '').lower()
+    return next((s for s in SEASONS if s.lower() in text), '')
+
+def _load(conn):
+    """Every usable record as numpy columns, streamed so only the arrays are held in memory."""
+    groups = {}  # (district, crop, season) -> group id; season '' = all seasons of that crop
+    group_ids, farmers, cost, yld, margin = [], [], [], [], []
+    cur = conn.cursor(InstrumentedSSCursor)
+    try:
+        cur.execute('''SELECT u.district, u.land_area, f.farmer_id, f.crop_name, f.season,
+                              f.total_expense, f.total_production, f.total_income, f.net_profit
+                       FROM financial_records f JOIN users u ON u.id = f.farmer_id
+                       WHERE u.land_area > 0 AND u.district IS NOT NULL AND u.district <> ''
+                       ''')
+        for r in cur:
+            district, crop = key(r['district']), key(r['crop_name'])
+            area = float(r['land_area'])
+            income = float(r['total_income'])
+            for season in {season_key(r['season']), ''}:
+                group_ids.append(groups.setdefault((district, crop, season), len(groups)))
+                farmers.append(r['farmer_id'])
+                cost.append(float(r['total_expense']) / area)
+                yld.append(float(r['total_production'] or 0) / area)
+                margin.append(float(r['net_profit']) / income * 100 if income > 0 else np.nan)
+    finally:
+        cur.close()
+    return groups, np.array(group_ids, dtype=np.int64), np.array(farmers, dtype=np.int64), \
+        {'cost': np.array(cost), 'yield': np.array(yld), 'margin': np.array(margin)}
+
+def group_percentiles(group, values, n_groups, quantiles=QUANTILES):
+    """(n_groups x len(quantiles)) linear-interpolated percentiles of ``values`` per group id,
+    NaN where a group has no finite value. One sort for all groups, no Python loop over them."""
+    out = np.full((n_groups, len(quantiles)), np.nan)
+    ok = np.isfinite(values)
+    g, v = group[ok], values[ok]
+    if not len(g):
+        return out
+    order = np.lexsort((v, g))
+    g, v = g[order], v[order]
+    starts = np.flatnonzero(np.r_[True, g[1:] != g[:-1]])
+    counts = np.diff(np.r_[starts, len(g)])
+    for j, q in enumerate(quantiles):
+        pos = starts + q * (counts - 1)
+        lo = np.floor(pos).astype(np.int64)
+        hi = np.ceil(pos).astype(np.int64)
+        out[g[starts], j] = v[lo] + (v[hi] - v[lo]) * (pos - lo)
+    return out
+
+def compute(conn):
+    """Recompute the whole district_benchmarks table; returns the number of groups written."""
+    groups, group, farmers, metrics = _load(conn)
+    n = len(groups)
+    records = np.bincount(group, minlength=n)
+    pairs = np.unique(np.stack([group, farmers], axis=1), axis=0) if len(group) else np.empty((0, 2), np.int64)
+    n_farmers = np.bincount(pairs[:, 0], minlength=n)
+    stats = {m: group_percentiles(group, metrics[m], n) for m in METRICS}
+
+    def num(x):
+        return None if np.isnan(x) else round(float(x), 2)
+
+    rows = []
+    for (district, crop, season), i in groups.items():
+        # Too few farmers and the "median" is one neighbour's private numbers
+        if n_farmers[i] < Config.BENCHMARK_MIN_FARMERS:
+            continue
+        rows.append((district, crop, season, int(n_farmers[i]), int(records[i]),
+                     *(num(x) for m in METRICS for x in stats[m][i])))
+    cur = conn.cursor()
+    try:
+        # One transaction: the dashboard sees either the old table or the new one
+        cur.execute('DELETE FROM district_benchmarks')
+        for start in range(0, len(rows), 1000):
+            cur.executemany('''INSERT INTO district_benchmarks (district, crop_key, season, farmers, records,
+                                   cost_p25, cost_p50, cost_p75, yield_p25, yield_p50, yield_p75,
+                                   margin_p25, margin_p50, margin_p75)
+                               VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                            rows[start:start + 1000])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+    return len(rows)
+
+def _locked_compute(conn):
+    # GET_LOCK keeps concurrent runs (several workers, or cron plus a worker) from overlapping
+    cur = conn.cursor()
+    cur.execute('SELECT GET_LOCK(%s, 0) AS got', (_LOCK,))
+    if not cur.fetchone()['got']:
+        cur.close()
+        return None
+    try:
+        return compute(conn)
+    finally:
+        cur.execute('SELECT RELEASE_LOCK(%s)', (_LOCK,))
+        cur.close()
+
+@jobs.periodic
+def _refresh(conn):
+    """Recompute once BENCHMARK_REFRESH_HOURS have passed since the last run (any worker's)."""
+    global _next_check
+    if np is None or not Config.BENCHMARK_REFRESH_HOURS or time.monotonic() < _next_check:
+        return
+    _next_check = time.monotonic() + 600
+    cur = conn.cursor()
+    cur.execute('SELECT MAX(computed_at) < NOW() - INTERVAL %s HOUR AS stale, COUNT(*) AS n FROM district_benchmarks',
+                (Config.BENCHMARK_REFRESH_HOURS,))
+    row = cur.fetchone()
+    conn.commit()
+    cur.close()
+    if row['n'] and not row['stale']:
+        return
+    written = _locked_compute(conn)
+    if written is not None:
+        logger.info('District benchmarks refreshed: %s groups', written)
+        _next_check = time.monotonic() + Config.BENCHMARK_REFRESH_HOURS * 3600
+
+def compare(cur, farmer, records):
+    """{record id: {metric: (yours, district median)}, plus 'farmers'} for the dashboard, from one
+    primary-key range read of district_benchmarks. A record's own season is used when there is a
+    benchmark for it, otherwise the crop's all-season row."""
+    if not records or not farmer or not key(farmer.get('district')) or not farmer.get('land_area'):
+        return {}
+    cur.execute('SELECT * FROM district_benchmarks WHERE district = %s AND crop_key IN %s',
+                (key(farmer['district']), sorted({key(r['crop_name']) for r in records})))
+    bench = {(b['crop_key'], b['season']): b for b in cur.fetchall()}
+    area = float(farmer['land_area'])
+    result = {}
+    for r in records:
+        crop = key(r['crop_name'])
+        b = bench.get((crop, season_key(r['season']))) or bench.get((crop, ''))
+        if not b:
+            continue
+        income = float(r['total_income'])
+        mine = {
+            'cost': float(r['total_expense']) / area,
+            'yield': float(r['total_production'] or 0) / area,
+            'margin': float(r['net_profit']) / income * 100 if income > 0 else None,
+        }
+        result[r['id']] = dict({m: (mine[m], b[f'{m}_p50']) for m in METRICS}, farmers=b['farmers'])
+    return result
+
+@click.command('benchmarks')
+def benchmarks_command():
+    """Recompute district cost/yield/margin benchmarks now (also runs every BENCHMARK_REFRESH_HOURS)."""
+    if np is None:
+        raise click.ClickException('numpy is required to compute benchmarks.')
+    conn = db.pool.acquire()
+    try:
+        written = _locked_compute(conn)
+        click.echo('Another run is in progress' if written is None else f'{written} benchmark group(s) written')
+    finally:
+        db.pool.release(conn)
+
+def init_benchmarks(app):
+    app.cli.add_command(benchmarks_command)
@@ -0,0 +1,124 @@
+# FarmIntel - In-process catalog cache (crops, schemes, products): TTL + LRU, write-through invalidation
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from config import Config
+
+_MISS = object()
+
+class CatalogCache:
+    """TTL and size-bounded LRU cache keyed by (namespace, key).
+
+    Admin writes call invalidate(), which drops the local entries and replaces a marker
+    file under ``directory``. Every worker process on the host compares the marker's stat
+    signature on each hit, so an invalidation in one gunicorn worker is seen by all of them.
+    """
+
+    def __init__(self, directory, ttl=300, max_entries=512, settle_seconds=0):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.settle_seconds = settle_seconds
+        self._data = OrderedDict()  # (namespace, key) -> (value, expires, signature)
+        self._lock = threading.Lock()
+
+    def _marker(self, namespace, key=None):
+        name = namespace if key is None else f'{namespace}.{key}'
+        return self.directory / f'{name}.gen'
+
+    def _stat(self, path):
+        try:
+            st = os.stat(path)
+            return (st.st_ino, st.st_mtime_ns)
+        except FileNotFoundError:
+            return None
+
+    def _signature(self, namespace, key):
+        return (self._stat(self._marker(namespace)), self._stat(self._marker(namespace, key)))
+
+    def _settled(self, signature):
+        """False while a marker is younger than settle_seconds (a lagging replica may still serve old rows)."""
+        if not self.settle_seconds:
+            return True
+        newest = max((s[1] for s in signature if s), default=0)
+        return time.time_ns() - newest > self.settle_seconds * 1e9
+
+    def get(self, namespace, key, default=None):
+        with self._lock:
+            entry = self._data.get((namespace, key))
+        if entry is None:
+            return default
+        value, expires, signature = entry
+        if expires < time.monotonic() or signature != self._signature(namespace, key):
+            with self._lock:
+                self._data.pop((namespace, key), None)
+            return default
+        with self._lock:
+            if (namespace, key) in self._data:
+                self._data.move_to_end((namespace, key))
+        return value
+
+    def set(self, namespace, key, value, signature=None):
+        if signature is None:
+            signature = self._signature(namespace, key)
+        if not self._settled(signature):
+            return
+        with self._lock:
+            self._data[(namespace, key)] = (value, time.monotonic() + self.ttl, signature)
+            self._data.move_to_end((namespace, key))
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def get_or_load(self, namespace, key, loader):
+        """Cached value, or loader() stored under the marker signature taken *before* loading,
+        so an invalidation that races with the load is never hidden."""
+        value = self.get(namespace, key, _MISS)
+        if value is _MISS:
+            signature = self._signature(namespace, key)
+            value = loader()
+            self.set(namespace, key, value, signature)
+        return value
+
+    def invalidate(self, namespace, *keys):
+        """Drop given keys of a namespace (all of it when no keys) here and in other workers."""
+        with self._lock:
+            if keys:
+                for key in keys:
+                    self._data.pop((namespace, key), None)
+            else:
+                for k in [k for k in self._data if k[0] == namespace]:
+                    del self._data[k]
+        for key in keys or (None,):
+            self._touch(self._marker(namespace, key))
+
+    def _touch(self, path):
+        # Replace (not rewrite) the marker so its inode changes even within one mtime tick
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f'{path.name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        tmp.write_bytes(b'')
+        os.replace(tmp, path)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+catalog = CatalogCache(Config.CATALOG_CACHE_DIR, Config.CATALOG_CACHE_TTL, Config.CATALOG_CACHE_MAX_ENTRIES)
+# Financial analytics, keyed by farmer: a separate LRU so busy farmers can't push out catalog pages
+analytics = CatalogCache(Config.ANALYTICS_CACHE_DIR, Config.ANALYTICS_CACHE_TTL, Config.ANALYTICS_CACHE_MAX_ENTRIES)
+
+def init_catalog_cache(app):
+    cfg = app.config
+    catalog.directory = Path(cfg.get('CATALOG_CACHE_DIR', Config.CATALOG_CACHE_DIR))
+    catalog.ttl = cfg.get('CATALOG_CACHE_TTL', Config.CATALOG_CACHE_TTL)
+    catalog.max_entries = cfg.get('CATALOG_CACHE_MAX_ENTRIES', Config.CATALOG_CACHE_MAX_ENTRIES)
+    # Rows read from a replica right after a write may be stale; don't cache them until replication catches up
+    if cfg.get('MYSQL_REPLICAS', Config.MYSQL_REPLICAS):
+        catalog.settle_seconds = cfg.get('MYSQL_REPLICA_STICKY_SECONDS', Config.MYSQL_REPLICA_STICKY_SECONDS)
+    catalog.directory.mkdir(parents=True, exist_ok=True)
+    analytics.directory = Path(cfg.get('ANALYTICS_CACHE_DIR', Config.ANALYTICS_CACHE_DIR))
+    analytics.ttl = cfg.get('ANALYTICS_CACHE_TTL', Config.ANALYTICS_CACHE_TTL)
+    analytics.max_entries = cfg.get('ANALYTICS_CACHE_MAX_ENTRIES', Config.ANALYTICS_CACHE_MAX_ENTRIES)
+    analytics.settle_seconds = catalog.settle_seconds
+    analytics.directory.mkdir(parents=True, exist_ok=True)
@@ -7,16 +7,91 @@ BASE_DIR = Path(__file__).resolve().parent
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'farmintel-secret-key-change-in-production'
     MYSQL_HOST = os.environ.get('MYSQL_HOST') or 'localhost'
+    MYSQL_PORT = int(os.environ.get('MYSQL_PORT') or 3306)
     MYSQL_USER = os.environ.get('MYSQL_USER') or 'root'
     MYSQL_PASSWORD = os.environ.get('MYSQL_PASSWORD') or ''
-    MYSQL_DB = 'farm_intel'
+    MYSQL_DB = os.environ.get('MYSQL_DB') or 'farm_intel'
     MYSQL_CURSORCLASS = 'DictCursor'
+    MYSQL_CONNECT_TIMEOUT = 5
+
+    # Connection pool (db.ConnectionPool): one pool per worker process
+    MYSQL_POOL_MIN = int(os.environ.get('MYSQL_POOL_MIN') or 2)
+    MYSQL_POOL_MAX = int(os.environ.get('MYSQL_POOL_MAX') or 10)
+    MYSQL_POOL_MAX_LIFETIME = int(os.environ.get('MYSQL_POOL_MAX_LIFETIME') or 1800)  # seconds; keep below MySQL wait_timeout
+    MYSQL_POOL_TIMEOUT = float(os.environ.get('MYSQL_POOL_TIMEOUT') or 10)  # seconds to wait for a free connection
+    MYSQL_POOL_PING_AFTER = float(os.environ.get('MYSQL_POOL_PING_AFTER') or 0)  # ping on checkout if idle this long
+
+    # Read replicas for @read_only views, e.g. MYSQL_REPLICAS="127.0.0.1:3307,127.0.0.1:3308"
+    MYSQL_REPLICAS = os.environ.get('MYSQL_REPLICAS') or ''
+    MYSQL_REPLICA_STICKY_SECONDS = int(os.environ.get('MYSQL_REPLICA_STICKY_SECONDS') or 10)  # read-your-writes window
+    MYSQL_REPLICA_RETRY_AFTER = 30  # seconds to skip a replica that failed to connect
+
+    # Query instrumentation (db_stats.py); logged as JSON on the 'farmintel.sql' logger
+    DB_SERVER_TIMING = True  # add a Server-Timing header with query count and DB time
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS') or 200)
+    SLOW_REQUEST_DB_MS = float(os.environ.get('SLOW_REQUEST_DB_MS') or 500)
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD') or 5)  # same statement this often in one request
 
     UPLOAD_FOLDER = BASE_DIR / 'static' / 'uploads'
     CROP_IMAGES_FOLDER = UPLOAD_FOLDER / 'crops'
     PRODUCT_IMAGES_FOLDER = UPLOAD_FOLDER / 'products'
+    UPLOAD_OBJECTS_FOLDER = UPLOAD_FOLDER / 'objects'  # new uploads, named by SHA-256 (uploads.py)
+    UPLOAD_CACHE_MAX_AGE = 365 * 24 * 3600  # Cache-Control max-age for objects/ (immutable)
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
 
+    # Resized copies made for every uploaded image (images.py); name -> max width in px
+    IMAGE_VARIANT_WIDTHS = {'thumb': 160, 'card': 480, 'detail': 1024}
+    IMAGE_WEBP_QUALITY = 80
+    IMAGE_JPEG_QUALITY = 82
+
+    # Background jobs (jobs.py)
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS') or 2)  # threads per web worker process
+    JOB_MAX_ATTEMPTS = 3
+    JOB_RETRY_DELAY = 10  # seconds, multiplied by the attempt number
+    JOB_POLL_SECONDS = 30  # how often leftover queued jobs are picked up
+    JOB_HEARTBEAT_SECONDS = 30  # how often a worker marks its running jobs as alive
+    JOB_STALE_SECONDS = 300  # 'running' with no heartbeat for this long = worker died; requeue
+
+    CROPS_PAGE_SIZE = 24  # crop cards per page / "Load more"
+    SEARCH_PAGE_SIZE = 20  # results per page on /search
+    ORDERS_PAGE_SIZE = 25  # orders per page in a farmer's order history
+    FINANCIAL_PAGE_SIZE = 25  # records per page on the financial dashboard
+
+    # Store pricing (pricing.py): GST percent per product category, e.g. {'Seeds': '0', 'Pesticides': '18'};
+    # categories not listed use GST_DEFAULT_RATE
+    GST_DEFAULT_RATE = '5'
+    GST_RATES = {}
+    # Quantity tiers: (minimum quantity per cart line, extra percent off), e.g. [(10, '2'), (50, '5')]
+    QUANTITY_TIERS = []
+
+    # Cart reservations: adding to cart holds stock for CART_HOLD_MINUTES (stock_holds table)
+    CART_RESERVATIONS = (os.environ.get('CART_RESERVATIONS') or '').lower() in ('1', 'true', 'yes')
+    CART_HOLD_MINUTES = int(os.environ.get('CART_HOLD_MINUTES') or 15)
+
+    # Bulk product import (product_import.py): rows per INSERT/transaction, rejected rows listed in the report
+    IMPORT_BATCH_SIZE = 1000
+    IMPORT_MAX_ERRORS = 500
+
+    # District benchmarks (benchmarks.py): recomputed by the job poller this often; groups with fewer farmers are not shown
+    BENCHMARK_REFRESH_HOURS = int(os.environ.get('BENCHMARK_REFRESH_HOURS') or 24)
+    BENCHMARK_MIN_FARMERS = 3
+
+    # Invoice documents (invoices.py), rendered at checkout and then served as files
+    INVOICE_FOLDER = BASE_DIR / 'instance' / 'invoices'
+
+    # Admin report exports (exporters.py), written by background jobs and deleted after EXPORT_RETENTION_HOURS
+    EXPORT_FOLDER = BASE_DIR / 'instance' / 'exports'
+    EXPORT_RETENTION_HOURS = int(os.environ.get('EXPORT_RETENTION_HOURS') or 24)
+
+    # Catalog cache (catalog_cache.py); marker files in CATALOG_CACHE_DIR sync invalidation across workers
+    CATALOG_CACHE_DIR = BASE_DIR / 'instance' / 'cache'
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL') or 300)  # seconds
+    CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES') or 512)
+    # Per-farmer financial analytics get their own store, so they never evict catalog entries
+    ANALYTICS_CACHE_DIR = CATALOG_CACHE_DIR / 'analytics'
+    ANALYTICS_CACHE_TTL = int(os.environ.get('ANALYTICS_CACHE_TTL') or 300)  # seconds
+    ANALYTICS_CACHE_MAX_ENTRIES = int(os.environ.get('ANALYTICS_CACHE_MAX_ENTRIES') or 256)
+
     for folder in (UPLOAD_FOLDER, CROP_IMAGES_FOLDER, PRODUCT_IMAGES_FOLDER):
         folder.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,9 @@
+-- FarmIntel migration 001: indexes for server-side crop search (crops.search)
+-- Run once on existing databases: mysql -u root -p farm_intel < database/migrations/001_crop_search_indexes.sql
+
+USE farm_intel;
+
+-- Season filter + (name, id) keyset order
+CREATE INDEX idx_crops_active_season ON crops(active, season, name, id);
+-- Unfiltered list: ordered scan for (name, id) keyset pages
+CREATE INDEX idx_crops_active_name ON crops(active, name, id);
@@ -0,0 +1,7 @@
+-- FarmIntel migration 002: resized WebP/JPEG variants recorded next to uploaded images
+-- Afterwards generate variants for existing uploads: flask --app app image-variants
+
+USE farm_intel;
+
+ALTER TABLE crops ADD COLUMN image_variants TEXT COMMENT 'JSON: image path -> {thumb, card, detail} variants' AFTER image_paths;
+ALTER TABLE products ADD COLUMN image_variants TEXT COMMENT 'JSON: {thumb, card, detail} variants of image_path' AFTER image_path;
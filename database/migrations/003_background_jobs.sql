@@ -0,0 +1,19 @@
+-- FarmIntel migration 003: durable background job queue; image variants are built outside the upload request
+
+USE farm_intel;
+
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(64) NOT NULL,
+    payload TEXT COMMENT 'JSON',
+    status ENUM('queued', 'running', 'done', 'failed') NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL DEFAULT NULL,
+    finished_at TIMESTAMP NULL DEFAULT NULL,
+    INDEX idx_jobs_status (status, created_at)
+);
+
+ALTER TABLE crops ADD COLUMN images_processing INT NOT NULL DEFAULT 0 COMMENT 'uploads still waiting for the image_variants job' AFTER image_variants;
+ALTER TABLE products ADD COLUMN images_processing INT NOT NULL DEFAULT 0 COMMENT 'uploads still waiting for the image_variants job' AFTER image_variants;
@@ -0,0 +1,12 @@
+-- FarmIntel migration 004: content-addressed uploads with reference counts
+-- Existing files under uploads/crops and uploads/products keep working; they are not tracked or deleted.
+
+USE farm_intel;
+
+CREATE TABLE IF NOT EXISTS upload_objects (
+    path VARCHAR(255) PRIMARY KEY COMMENT 'uploads/objects/<ab>/<sha256>.<ext>, relative to static/',
+    sha256 CHAR(64) NOT NULL,
+    size INT NOT NULL,
+    ref_count INT NOT NULL DEFAULT 1 COMMENT 'crop/product image slots using this file',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
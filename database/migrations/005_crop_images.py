@@ -0,0 +1,72 @@
+"""FarmIntel migration 005: move crop images from the JSON crops.image_paths/image_variants columns
+into the crop_images table, with crops.cover_image/cover_variants holding the first image.
+
+Unlike the .sql migrations this one is a Python script, because the JSON has to be parsed
+(MariaDB in XAMPP has no JSON_TABLE). Run it from the project folder:
+
+    python database/migrations/005_crop_images.py
+"""
+import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+
+import pymysql
+from config import Config
+
+def _columns(cur, table):
+    cur.execute('SELECT COLUMN_NAME FROM information_schema.COLUMNS WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s',
+                (Config.MYSQL_DB, table))
+    return {r['COLUMN_NAME'] for r in cur.fetchall()}
+
+def _paths(value):
+    try:
+        data = json.loads(value) if value else []
+    except ValueError:
+        return [value]  # a single bare path
+    return [p for p in (data if isinstance(data, list) else [data]) if isinstance(p, str) and p]
+
+def main():
+    conn = pymysql.connect(host=Config.MYSQL_HOST, port=Config.MYSQL_PORT, user=Config.MYSQL_USER,
+                           password=Config.MYSQL_PASSWORD, database=Config.MYSQL_DB, charset='utf8mb4',
+                           cursorclass=pymysql.cursors.DictCursor)
+    cur = conn.cursor()
+    cur.execute('''CREATE TABLE IF NOT EXISTS crop_images (
+                       id INT AUTO_INCREMENT PRIMARY KEY,
+                       crop_id INT NOT NULL,
+                       position INT NOT NULL,
+                       path VARCHAR(255) NOT NULL COMMENT 'relative to static/',
+                       variants TEXT COMMENT 'JSON: {thumb, card, detail} variants',
+                       FOREIGN KEY (crop_id) REFERENCES crops(id) ON DELETE CASCADE,
+                       UNIQUE KEY uq_crop_images_position (crop_id, position)
+                   )''')
+    columns = _columns(cur, 'crops')
+    if 'cover_image' not in columns:
+        cur.execute('''ALTER TABLE crops
+                       ADD COLUMN cover_image VARCHAR(255) DEFAULT NULL COMMENT 'first crop_images.path, copied for list cards' AFTER category,
+                       ADD COLUMN cover_variants TEXT COMMENT 'JSON: {thumb, card, detail} variants of cover_image' AFTER cover_image''')
+    if 'image_paths' not in columns:
+        print('crops.image_paths is already gone; nothing to copy.')
+        return
+    cur.execute('SELECT id, image_paths, image_variants FROM crops')
+    rows = cur.fetchall()
+    for crop in rows:
+        paths = list(dict.fromkeys(_paths(crop['image_paths'])))
+        try:
+            variants = json.loads(crop['image_variants']) if crop['image_variants'] else {}
+        except ValueError:
+            variants = {}
+        images = [(crop['id'], i, p, json.dumps(variants[p]) if variants.get(p) else None) for i, p in enumerate(paths)]
+        cur.execute('DELETE FROM crop_images WHERE crop_id = %s', (crop['id'],))
+        if images:
+            cur.executemany('INSERT INTO crop_images (crop_id, position, path, variants) VALUES (%s, %s, %s, %s)', images)
+        cur.execute('UPDATE crops SET cover_image = %s, cover_variants = %s WHERE id = %s',
+                    (images[0][2] if images else None, images[0][3] if images else None, crop['id']))
+    conn.commit()
+    cur.execute('ALTER TABLE crops DROP COLUMN image_paths, DROP COLUMN image_variants')
+    print(f'Copied images of {len(rows)} crop(s) into crop_images.')
+    conn.close()
+
+if __name__ == '__main__':
+    main()
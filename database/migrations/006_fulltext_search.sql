@@ -0,0 +1,10 @@
+-- FarmIntel migration 006: FULLTEXT indexes for /search across crops, schemes and products
+
+USE farm_intel;
+
+CREATE FULLTEXT INDEX ft_crops_name ON crops(name);
+CREATE FULLTEXT INDEX ft_crops_text ON crops(name, description, best_seeds_name, fertilizer_name, pesticides_name);
+CREATE FULLTEXT INDEX ft_schemes_name ON schemes(name);
+CREATE FULLTEXT INDEX ft_schemes_text ON schemes(name, eligible_crop, benefits);
+CREATE FULLTEXT INDEX ft_products_name ON products(name);
+CREATE FULLTEXT INDEX ft_products_text ON products(name, brand, usage_crops, nutrient_composition);
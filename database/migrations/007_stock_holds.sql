@@ -0,0 +1,16 @@
+-- FarmIntel migration 007: expiring stock reservations for carts (used when CART_RESERVATIONS is on)
+
+USE farm_intel;
+
+CREATE TABLE IF NOT EXISTS stock_holds (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    farmer_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    FOREIGN KEY (farmer_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    UNIQUE KEY (farmer_id, product_id),
+    INDEX idx_stock_holds_product (product_id, expires_at, quantity),
+    INDEX idx_stock_holds_expiry (expires_at)
+);
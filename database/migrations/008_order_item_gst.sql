@@ -0,0 +1,10 @@
+-- FarmIntel migration 008: store the GST charged on each order line (pricing.py, per-category rates)
+
+USE farm_intel;
+
+ALTER TABLE order_items
+    ADD COLUMN gst_rate DECIMAL(5,2) NOT NULL DEFAULT 0,
+    ADD COLUMN gst_amount DECIMAL(12,2) NOT NULL DEFAULT 0;
+
+-- Orders placed before this migration were all charged the flat 5%
+UPDATE order_items SET gst_rate = 5, gst_amount = ROUND(price_per_unit * quantity * 0.05, 2);
@@ -0,0 +1,25 @@
+-- FarmIntel migration 009: order history pages (keyset on farmer, date, id) and per-order summaries
+-- The new index also serves every lookup the bare farmer_id index did (including the foreign
+-- key), so that one is dropped in the same statement.
+
+USE farm_intel;
+
+ALTER TABLE orders
+    ADD COLUMN item_count INT NOT NULL DEFAULT 0,
+    ADD COLUMN items_summary VARCHAR(255) NULL,
+    ADD INDEX idx_orders_farmer_date (farmer_id, order_date, id),
+    DROP INDEX idx_orders_farmer;
+
+-- Summaries for existing orders: line count and the three largest lines' product names
+UPDATE orders o
+JOIN (
+    SELECT order_id, COUNT(*) AS n,
+           GROUP_CONCAT(CASE WHEN rn <= 3 THEN name END ORDER BY rn SEPARATOR ', ') AS names
+    FROM (
+        SELECT oi.order_id, p.name,
+               ROW_NUMBER() OVER (PARTITION BY oi.order_id ORDER BY oi.price_per_unit * oi.quantity DESC, oi.id) AS rn
+        FROM order_items oi JOIN products p ON p.id = oi.product_id
+    ) ranked
+    GROUP BY order_id
+) s ON s.order_id = o.id
+SET o.item_count = s.n, o.items_summary = LEFT(s.names, 255);
@@ -0,0 +1,8 @@
+-- FarmIntel migration 010: keep the product name on each order line, so renaming a product
+-- never changes an invoice (invoices.py renders from order_items alone)
+
+USE farm_intel;
+
+ALTER TABLE order_items ADD COLUMN product_name VARCHAR(200) NULL AFTER product_id;
+
+UPDATE order_items oi JOIN products p ON p.id = oi.product_id SET oi.product_name = p.name;
@@ -0,0 +1,5 @@
+-- FarmIntel migration 011: product SKU, the key bulk imports upsert on (products added by hand may leave it empty)
+
+USE farm_intel;
+
+ALTER TABLE products ADD COLUMN sku VARCHAR(64) NULL UNIQUE COMMENT 'distributor code; bulk import upserts by it' AFTER id;
@@ -0,0 +1,24 @@
+-- FarmIntel migration 012: daily and monthly store sales by product, category and district (sales.py)
+-- Fill them from existing orders afterwards: flask --app app sales-rollup
+
+USE farm_intel;
+
+CREATE TABLE IF NOT EXISTS sales_daily (
+    period DATE NOT NULL,
+    dimension ENUM('product', 'category', 'district') NOT NULL,
+    dim_key VARCHAR(100) NOT NULL COMMENT 'product id, category or district name',
+    orders INT NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT 'before GST',
+    PRIMARY KEY (period, dimension, dim_key)
+);
+
+CREATE TABLE IF NOT EXISTS sales_monthly (
+    period DATE NOT NULL COMMENT 'first day of the month',
+    dimension ENUM('product', 'category', 'district') NOT NULL,
+    dim_key VARCHAR(100) NOT NULL COMMENT 'product id, category or district name',
+    orders INT NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT 'before GST',
+    PRIMARY KEY (period, dimension, dim_key)
+);
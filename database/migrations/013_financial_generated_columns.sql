@@ -0,0 +1,28 @@
+-- FarmIntel migration 013: expense, income, profit and status as stored generated columns
+-- MySQL/MariaDB compute them for every existing row while adding the columns (no separate backfill
+-- step) and keep them current on every INSERT/UPDATE. The expressions are written out in full
+-- because MariaDB does not let a generated column refer to another generated column.
+
+USE farm_intel;
+
+ALTER TABLE financial_records
+    ADD COLUMN total_expense DECIMAL(15,2) AS (
+        COALESCE(seeds_cost, 0) + COALESCE(fertilizer_cost, 0) + COALESCE(pesticides_cost, 0) + COALESCE(irrigation_cost, 0)
+        + COALESCE(labour_cost, 0) + COALESCE(machinery_cost, 0) + COALESCE(other_expenses, 0)
+    ) STORED,
+    ADD COLUMN total_income DECIMAL(26,2) AS (
+        ROUND(COALESCE(total_production, 0) * COALESCE(selling_price, 0), 2)
+    ) STORED,
+    ADD COLUMN net_profit DECIMAL(26,2) AS (
+        ROUND(COALESCE(total_production, 0) * COALESCE(selling_price, 0), 2)
+        - (COALESCE(seeds_cost, 0) + COALESCE(fertilizer_cost, 0) + COALESCE(pesticides_cost, 0) + COALESCE(irrigation_cost, 0)
+           + COALESCE(labour_cost, 0) + COALESCE(machinery_cost, 0) + COALESCE(other_expenses, 0))
+    ) STORED,
+    ADD COLUMN status VARCHAR(20) AS (
+        CASE SIGN(ROUND(COALESCE(total_production, 0) * COALESCE(selling_price, 0), 2)
+                  - (COALESCE(seeds_cost, 0) + COALESCE(fertilizer_cost, 0) + COALESCE(pesticides_cost, 0) + COALESCE(irrigation_cost, 0)
+                     + COALESCE(labour_cost, 0) + COALESCE(machinery_cost, 0) + COALESCE(other_expenses, 0)))
+            WHEN 1 THEN 'Profit' WHEN -1 THEN 'Loss' ELSE 'No Profit No Loss' END
+    ) STORED,
+    ADD INDEX idx_financial_farmer_profit (farmer_id, net_profit),
+    ADD INDEX idx_financial_farmer_status (farmer_id, status);
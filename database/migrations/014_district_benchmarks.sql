@@ -0,0 +1,16 @@
+-- FarmIntel migration 014: district benchmarks, filled by benchmarks.py (job poller, or: flask --app app benchmarks)
+
+USE farm_intel;
+
+CREATE TABLE IF NOT EXISTS district_benchmarks (
+    district VARCHAR(100) NOT NULL COMMENT 'lower-case, single-spaced (benchmarks.key)',
+    crop_key VARCHAR(150) NOT NULL COMMENT 'lower-case crop name',
+    season VARCHAR(10) NOT NULL DEFAULT '' COMMENT 'Kharif / Rabi / Zaid; empty = all seasons',
+    farmers INT NOT NULL,
+    records INT NOT NULL,
+    cost_p25 DECIMAL(14,2), cost_p50 DECIMAL(14,2), cost_p75 DECIMAL(14,2) COMMENT 'total expense per acre',
+    yield_p25 DECIMAL(14,2), yield_p50 DECIMAL(14,2), yield_p75 DECIMAL(14,2) COMMENT 'production per acre',
+    margin_p25 DECIMAL(10,2), margin_p50 DECIMAL(10,2), margin_p75 DECIMAL(10,2) COMMENT 'net profit, % of income',
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (district, crop_key, season)
+);
@@ -0,0 +1,24 @@
+-- FarmIntel migration 015: financial record imports (financial_import.py), idempotent per farmer + batch key
+
+USE farm_intel;
+
+CREATE TABLE IF NOT EXISTS import_batches (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    farmer_id INT NOT NULL,
+    batch_key VARCHAR(64) NOT NULL,
+    filename VARCHAR(255) DEFAULT NULL,
+    status ENUM('running', 'done') NOT NULL DEFAULT 'running',
+    imported INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME DEFAULT NULL,
+    FOREIGN KEY (farmer_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_import_batches_key (farmer_id, batch_key)
+);
+
+-- Which upload and file row a record came from; the unique key makes a re-upload skip rows it already added
+ALTER TABLE financial_records
+    ADD COLUMN import_batch_id INT NULL,
+    ADD COLUMN source_row INT NULL,
+    ADD UNIQUE KEY uq_financial_import_row (import_batch_id, source_row),
+    ADD FOREIGN KEY (import_batch_id) REFERENCES import_batches(id) ON DELETE SET NULL;
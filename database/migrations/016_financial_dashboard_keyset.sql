@@ -0,0 +1,9 @@
+-- FarmIntel migration 016: financial dashboard pages (keyset on farmer, created_at, id)
+-- The new index also serves every lookup the bare farmer_id index did (including the foreign
+-- key), so that one is dropped in the same statement.
+
+USE farm_intel;
+
+ALTER TABLE financial_records
+    ADD INDEX idx_financial_farmer_created (farmer_id, created_at, id),
+    DROP INDEX idx_financial_farmer;
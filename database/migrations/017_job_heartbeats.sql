@@ -0,0 +1,7 @@
+-- FarmIntel migration 017: job heartbeats; only jobs whose worker stopped beating are requeued (jobs.py)
+
+USE farm_intel;
+
+ALTER TABLE jobs ADD COLUMN heartbeat_at TIMESTAMP NULL DEFAULT NULL AFTER started_at;
+
+UPDATE jobs SET heartbeat_at = started_at WHERE status = 'running';
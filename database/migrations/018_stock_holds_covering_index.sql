@@ -0,0 +1,8 @@
+-- FarmIntel migration 018: idx_stock_holds_product also carries farmer_id, so the "held by other
+-- farmers" sum in routes/store.py (_held) is answered from the index without reading the rows
+
+USE farm_intel;
+
+ALTER TABLE stock_holds
+    DROP INDEX idx_stock_holds_product,
+    ADD INDEX idx_stock_holds_product (product_id, expires_at, quantity, farmer_id);
@@ -0,0 +1,16 @@
+-- FarmIntel migration 019: keep the buyer's name, mobile and address on each order, so a later
+-- profile edit never changes an invoice (invoices.py renders from the order alone)
+
+USE farm_intel;
+
+ALTER TABLE orders
+    ADD COLUMN buyer_name VARCHAR(150) NULL AFTER farmer_id,
+    ADD COLUMN buyer_mobile VARCHAR(15) NULL AFTER buyer_name,
+    ADD COLUMN buyer_village VARCHAR(100) NULL AFTER buyer_mobile,
+    ADD COLUMN buyer_taluka VARCHAR(100) NULL AFTER buyer_village,
+    ADD COLUMN buyer_district VARCHAR(100) NULL AFTER buyer_taluka;
+
+-- Existing orders: the profile as it is now is the best record there is
+UPDATE orders o JOIN users u ON u.id = o.farmer_id
+SET o.buyer_name = u.name, o.buyer_mobile = u.mobile, o.buyer_village = u.village,
+    o.buyer_taluka = u.taluka, o.buyer_district = u.district;
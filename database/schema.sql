@@ -29,7 +29,9 @@ CREATE TABLE IF NOT EXISTS crops (
     id INT AUTO_INCREMENT PRIMARY KEY,
     name VARCHAR(150) NOT NULL,
     category ENUM('Spices', 'Vegetables', 'Pulses', 'Oil Seeds', 'Fruits') NOT NULL,
-    image_paths TEXT COMMENT 'JSON array of image paths',
+    cover_image VARCHAR(255) DEFAULT NULL COMMENT 'first crop_images.path, copied for list cards',
+    cover_variants TEXT COMMENT 'JSON: {thumb, card, detail} variants of cover_image',
+    images_processing INT NOT NULL DEFAULT 0 COMMENT 'uploads still waiting for the image_variants job',
     duration VARCHAR(100) DEFAULT NULL,
     average_price DECIMAL(12,2) DEFAULT NULL,
     market_price DECIMAL(12,2) DEFAULT NULL,
@@ -44,6 +46,17 @@ CREATE TABLE IF NOT EXISTS crops (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Crop images in display order (cover_image above mirrors position 0)
+CREATE TABLE IF NOT EXISTS crop_images (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    crop_id INT NOT NULL,
+    position INT NOT NULL,
+    path VARCHAR(255) NOT NULL COMMENT 'relative to static/',
+    variants TEXT COMMENT 'JSON: {thumb, card, detail} variants',
+    FOREIGN KEY (crop_id) REFERENCES crops(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_crop_images_position (crop_id, position)
+);
+
 -- Government Schemes
 CREATE TABLE IF NOT EXISTS schemes (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -61,8 +74,11 @@ CREATE TABLE IF NOT EXISTS schemes (
 -- Store Products (Fertilizers, Seeds, Pesticides, Equipment, Tools)
 CREATE TABLE IF NOT EXISTS products (
     id INT AUTO_INCREMENT PRIMARY KEY,
+    sku VARCHAR(64) NULL UNIQUE COMMENT 'distributor code; bulk import upserts by it',
     name VARCHAR(200) NOT NULL,
     image_path VARCHAR(500) DEFAULT NULL,
+    image_variants TEXT COMMENT 'JSON: {thumb, card, detail} variants of image_path',
+    images_processing INT NOT NULL DEFAULT 0 COMMENT 'uploads still waiting for the image_variants job',
     category ENUM('Fertilizers', 'Seeds', 'Pesticides', 'Equipment', 'Tools') NOT NULL,
     brand VARCHAR(100) DEFAULT NULL,
     description TEXT,
@@ -86,16 +102,39 @@ CREATE TABLE IF NOT EXISTS cart (
     UNIQUE KEY (farmer_id, product_id)
 );
 
+-- Cart reservations (CART_RESERVATIONS): stock held for a farmer's cart until expires_at
+CREATE TABLE IF NOT EXISTS stock_holds (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    farmer_id INT NOT NULL,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    expires_at DATETIME NOT NULL,
+    FOREIGN KEY (farmer_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE,
+    UNIQUE KEY (farmer_id, product_id),
+    INDEX idx_stock_holds_product (product_id, expires_at, quantity, farmer_id),
+    INDEX idx_stock_holds_expiry (expires_at)
+);
+
 -- Orders
 CREATE TABLE IF NOT EXISTS orders (
     id INT AUTO_INCREMENT PRIMARY KEY,
     farmer_id INT NOT NULL,
+    -- Buyer as at checkout (invoices.py), unaffected by later profile edits
+    buyer_name VARCHAR(150) NULL,
+    buyer_mobile VARCHAR(15) NULL,
+    buyer_village VARCHAR(100) NULL,
+    buyer_taluka VARCHAR(100) NULL,
+    buyer_district VARCHAR(100) NULL,
     order_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     subtotal DECIMAL(12,2) NOT NULL,
     gst DECIMAL(12,2) DEFAULT 0,
     total DECIMAL(12,2) NOT NULL,
     status VARCHAR(50) DEFAULT 'Completed',
-    FOREIGN KEY (farmer_id) REFERENCES users(id) ON DELETE CASCADE
+    item_count INT NOT NULL DEFAULT 0,
+    items_summary VARCHAR(255) NULL,
+    FOREIGN KEY (farmer_id) REFERENCES users(id) ON DELETE CASCADE,
+    INDEX idx_orders_farmer_date (farmer_id, order_date, id)
 );
 
 -- Order Items
@@ -103,12 +142,51 @@ CREATE TABLE IF NOT EXISTS order_items (
     id INT AUTO_INCREMENT PRIMARY KEY,
     order_id INT NOT NULL,
     product_id INT NOT NULL,
+    product_name VARCHAR(200) NULL,
     quantity INT NOT NULL,
     price_per_unit DECIMAL(12,2) NOT NULL,
+    gst_rate DECIMAL(5,2) NOT NULL DEFAULT 0,
+    gst_amount DECIMAL(12,2) NOT NULL DEFAULT 0,
     FOREIGN KEY (order_id) REFERENCES orders(id) ON DELETE CASCADE,
     FOREIGN KEY (product_id) REFERENCES products(id) ON DELETE CASCADE
 );
 
+-- Store sales rollups (sales.py)
+CREATE TABLE IF NOT EXISTS sales_daily (
+    period DATE NOT NULL,
+    dimension ENUM('product', 'category', 'district') NOT NULL,
+    dim_key VARCHAR(100) NOT NULL COMMENT 'product id, category or district name',
+    orders INT NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT 'before GST',
+    PRIMARY KEY (period, dimension, dim_key)
+);
+
+CREATE TABLE IF NOT EXISTS sales_monthly (
+    period DATE NOT NULL COMMENT 'first day of the month',
+    dimension ENUM('product', 'category', 'district') NOT NULL,
+    dim_key VARCHAR(100) NOT NULL COMMENT 'product id, category or district name',
+    orders INT NOT NULL DEFAULT 0,
+    units INT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0 COMMENT 'before GST',
+    PRIMARY KEY (period, dimension, dim_key)
+);
+
+-- Financial record imports (financial_import.py)
+CREATE TABLE IF NOT EXISTS import_batches (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    farmer_id INT NOT NULL,
+    batch_key VARCHAR(64) NOT NULL,
+    filename VARCHAR(255) DEFAULT NULL,
+    status ENUM('running', 'done') NOT NULL DEFAULT 'running',
+    imported INT NOT NULL DEFAULT 0,
+    failed INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at DATETIME DEFAULT NULL,
+    FOREIGN KEY (farmer_id) REFERENCES users(id) ON DELETE CASCADE,
+    UNIQUE KEY uq_import_batches_key (farmer_id, batch_key)
+);
+
 -- Financial Analysis (Farmer)
 CREATE TABLE IF NOT EXISTS financial_records (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -125,13 +203,85 @@ CREATE TABLE IF NOT EXISTS financial_records (
     total_production DECIMAL(12,2) DEFAULT NULL,
     selling_price DECIMAL(12,2) DEFAULT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    FOREIGN KEY (farmer_id) REFERENCES users(id) ON DELETE CASCADE
+    -- Computed by the database (migration 013); expressions in full, MariaDB cannot chain generated columns
+    total_expense DECIMAL(15,2) AS (
+        COALESCE(seeds_cost, 0) + COALESCE(fertilizer_cost, 0) + COALESCE(pesticides_cost, 0) + COALESCE(irrigation_cost, 0)
+        + COALESCE(labour_cost, 0) + COALESCE(machinery_cost, 0) + COALESCE(other_expenses, 0)
+    ) STORED,
+    total_income DECIMAL(26,2) AS (
+        ROUND(COALESCE(total_production, 0) * COALESCE(selling_price, 0), 2)
+    ) STORED,
+    net_profit DECIMAL(26,2) AS (
+        ROUND(COALESCE(total_production, 0) * COALESCE(selling_price, 0), 2)
+        - (COALESCE(seeds_cost, 0) + COALESCE(fertilizer_cost, 0) + COALESCE(pesticides_cost, 0) + COALESCE(irrigation_cost, 0)
+           + COALESCE(labour_cost, 0) + COALESCE(machinery_cost, 0) + COALESCE(other_expenses, 0))
+    ) STORED,
+    status VARCHAR(20) AS (
+        CASE SIGN(ROUND(COALESCE(total_production, 0) * COALESCE(selling_price, 0), 2)
+                  - (COALESCE(seeds_cost, 0) + COALESCE(fertilizer_cost, 0) + COALESCE(pesticides_cost, 0) + COALESCE(irrigation_cost, 0)
+                     + COALESCE(labour_cost, 0) + COALESCE(machinery_cost, 0) + COALESCE(other_expenses, 0)))
+            WHEN 1 THEN 'Profit' WHEN -1 THEN 'Loss' ELSE 'No Profit No Loss' END
+    ) STORED,
+    import_batch_id INT NULL COMMENT 'upload this record came from (migration 015)',
+    source_row INT NULL,
+    FOREIGN KEY (farmer_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (import_batch_id) REFERENCES import_batches(id) ON DELETE SET NULL,
+    UNIQUE KEY uq_financial_import_row (import_batch_id, source_row)
+);
+
+-- District benchmarks (benchmarks.py)
+CREATE TABLE IF NOT EXISTS district_benchmarks (
+    district VARCHAR(100) NOT NULL COMMENT 'lower-case, single-spaced (benchmarks.key)',
+    crop_key VARCHAR(150) NOT NULL COMMENT 'lower-case crop name',
+    season VARCHAR(10) NOT NULL DEFAULT '' COMMENT 'Kharif / Rabi / Zaid; empty = all seasons',
+    farmers INT NOT NULL,
+    records INT NOT NULL,
+    cost_p25 DECIMAL(14,2), cost_p50 DECIMAL(14,2), cost_p75 DECIMAL(14,2) COMMENT 'total expense per acre',
+    yield_p25 DECIMAL(14,2), yield_p50 DECIMAL(14,2), yield_p75 DECIMAL(14,2) COMMENT 'production per acre',
+    margin_p25 DECIMAL(10,2), margin_p50 DECIMAL(10,2), margin_p75 DECIMAL(10,2) COMMENT 'net profit, % of income',
+    computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (district, crop_key, season)
 );
 
 -- Indexes for common queries
+-- Background jobs (jobs.py): image variants etc., run after the request that queued them
+CREATE TABLE IF NOT EXISTS jobs (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    kind VARCHAR(64) NOT NULL,
+    payload TEXT COMMENT 'JSON',
+    status ENUM('queued', 'running', 'done', 'failed') NOT NULL DEFAULT 'queued',
+    attempts INT NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    started_at TIMESTAMP NULL DEFAULT NULL,
+    heartbeat_at TIMESTAMP NULL DEFAULT NULL COMMENT 'refreshed by the running worker; stale = worker died',
+    finished_at TIMESTAMP NULL DEFAULT NULL,
+    INDEX idx_jobs_status (status, created_at)
+);
+
+-- Uploaded files stored by content hash (uploads.py); deleted when ref_count drops to 0
+CREATE TABLE IF NOT EXISTS upload_objects (
+    path VARCHAR(255) PRIMARY KEY COMMENT 'uploads/objects/<ab>/<sha256>.<ext>, relative to static/',
+    sha256 CHAR(64) NOT NULL,
+    size INT NOT NULL,
+    ref_count INT NOT NULL DEFAULT 1 COMMENT 'crop/product image slots using this file',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE INDEX idx_users_role ON users(role);
 CREATE INDEX idx_users_email ON users(email);
 CREATE INDEX idx_crops_active_category ON crops(active, category);
+CREATE INDEX idx_crops_active_season ON crops(active, season, name, id);
+CREATE INDEX idx_crops_active_name ON crops(active, name, id);
 CREATE INDEX idx_products_category ON products(category);
-CREATE INDEX idx_orders_farmer ON orders(farmer_id);
-CREATE INDEX idx_financial_farmer ON financial_records(farmer_id);
+CREATE INDEX idx_financial_farmer_created ON financial_records(farmer_id, created_at, id);
+CREATE INDEX idx_financial_farmer_profit ON financial_records(farmer_id, net_profit);
+CREATE INDEX idx_financial_farmer_status ON financial_records(farmer_id, status);
+
+-- Site search (routes/search.py); the column lists must match search.SOURCES
+CREATE FULLTEXT INDEX ft_crops_name ON crops(name);
+CREATE FULLTEXT INDEX ft_crops_text ON crops(name, description, best_seeds_name, fertilizer_name, pesticides_name);
+CREATE FULLTEXT INDEX ft_schemes_name ON schemes(name);
+CREATE FULLTEXT INDEX ft_schemes_text ON schemes(name, eligible_crop, benefits);
+CREATE FULLTEXT INDEX ft_products_name ON products(name);
+CREATE FULLTEXT INDEX ft_products_text ON products(name, brand, usage_crops, nutrient_composition);
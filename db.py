@@ -1,27 +1,240 @@
 # FarmIntel - MySQL connection using PyMySQL (no system MySQL libs needed)
-import pymysql.cursors
-from flask import g
+import random
+import threading
+import time
+from collections import deque
+from functools import wraps
+import pymysql
+import pymysql.connections
+from flask import g, session, current_app, has_request_context
 from config import Config
+from db_stats import InstrumentedCursor, init_db_stats
+
+# Session key holding the time until which reads must stay on the primary
+STICKY_KEY = '_db_primary_until'
+
+class PoolTimeout(Exception):
+    """No connection became free within MYSQL_POOL_TIMEOUT seconds."""
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of PyMySQL connections.
+
+    Idle connections are reused LIFO so the warmest socket is handed out first.
+    On checkout a connection is pinged if it sat idle longer than ``ping_after``
+    and replaced if it is older than ``max_lifetime``. On return any open
+    transaction is rolled back so the next request starts clean.
+    """
+
+    def __init__(self, connect_kwargs, min_size=1, max_size=10, max_lifetime=1800, timeout=10, ping_after=0,
+                 connection_class=pymysql.connections.Connection):
+        self.connect_kwargs = connect_kwargs
+        self.connection_class = connection_class
+        self.min_size = min_size
+        self.max_size = max(max_size, 1)
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.ping_after = ping_after
+        self._idle = deque()        # (conn, last_used)
+        self._born = {}             # id(conn) -> created (monotonic)
+        self._size = 0
+        self._warmed = False
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        conn = self.connection_class(**self.connect_kwargs)
+        self._born[id(conn)] = time.monotonic()
+        return conn
+
+    def _expired(self, conn):
+        if not self.max_lifetime:
+            return False
+        return time.monotonic() - self._born.get(id(conn), 0) > self.max_lifetime
+
+    def _discard(self, conn):
+        self._born.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _warm(self):
+        """Open up to min_size connections once, on first use (not at import)."""
+        with self._cond:
+            if self._warmed:
+                return
+            self._warmed = True
+            missing = max(0, min(self.min_size, self.max_size) - self._size)
+            self._size += missing
+        opened = 0
+        try:
+            for _ in range(missing):
+                conn = self._connect()
+                opened += 1
+                with self._cond:
+                    self._idle.append((conn, time.monotonic()))
+                    self._cond.notify()
+        except pymysql.MySQLError:
+            with self._cond:
+                self._size -= missing - opened
+                self._cond.notify_all()
+
+    def acquire(self):
+        if not self._warmed:
+            self._warm()
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f'No MySQL connection available after {self.timeout}s (max {self.max_size}).')
+                self._cond.wait(remaining)
+        if conn is not None:
+            if self._expired(conn):
+                self._discard(conn)
+                conn = None
+            elif time.monotonic() - last_used >= self.ping_after:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self._discard(conn)
+                    conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        try:
+            conn.rollback()
+            healthy = not self._expired(conn)
+        except Exception:
+            healthy = False
+        with self._cond:
+            if healthy:
+                self._idle.append((conn, time.monotonic()))
+            else:
+                self._size -= 1
+            self._cond.notify()
+        if not healthy:
+            self._discard(conn)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._discard(conn)
+
+class PrimaryConnection(pymysql.connections.Connection):
+    """Primary connection: a commit during a request pins that session's reads to the primary
+    for MYSQL_REPLICA_STICKY_SECONDS, so a farmer always sees their own cart/order/record.
+    Without replicas every read already goes to the primary, and no session cookie is written."""
+
+    def commit(self):
+        super().commit()
+        if replica_pools and has_request_context():
+            sticky = current_app.config.get('MYSQL_REPLICA_STICKY_SECONDS', Config.MYSQL_REPLICA_STICKY_SECONDS)
+            session[STICKY_KEY] = time.time() + sticky
+
+pool = None
+replica_pools = []
+_replica_down = {}  # id(pool) -> monotonic time until which the replica is skipped
+
+def _parse_hosts(value):
+    """'host1:3307,host2' -> [('host1', 3307), ('host2', 3306)]"""
+    hosts = []
+    for item in (value or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        host, _, port = item.partition(':')
+        hosts.append((host, int(port or 3306)))
+    return hosts
+
+def _connect_kwargs(config, host=None, port=None):
+    return dict(
+        host=host or config.get('MYSQL_HOST', Config.MYSQL_HOST),
+        port=int(port or config.get('MYSQL_PORT', Config.MYSQL_PORT)),
+        user=config.get('MYSQL_USER', Config.MYSQL_USER),
+        password=config.get('MYSQL_PASSWORD', Config.MYSQL_PASSWORD),
+        database=config.get('MYSQL_DB', Config.MYSQL_DB),
+        cursorclass=InstrumentedCursor,
+        connect_timeout=config.get('MYSQL_CONNECT_TIMEOUT', Config.MYSQL_CONNECT_TIMEOUT),
+    )
+
+def read_only(f):
+    """Mark a view as read-only so its queries may be served by a read replica."""
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        g.db_read_only = True
+        return f(*args, **kwargs)
+    return decorated
+
+def _pick_replica():
+    if not replica_pools or not g.get('db_read_only'):
+        return None
+    if session.get(STICKY_KEY, 0) > time.time():
+        return None
+    now = time.monotonic()
+    candidates = [p for p in replica_pools if _replica_down.get(id(p), 0) <= now]
+    return random.choice(candidates) if candidates else None
 
 def get_db():
-    """Get current request DB connection (DictCursor)."""
+    """Get current request DB connection (DictCursor), checked out from the pool.
+
+    Views decorated with @read_only use a replica unless the session recently committed
+    on the primary; an unreachable replica is skipped for MYSQL_REPLICA_RETRY_AFTER seconds.
+    """
     if 'db' not in g:
-        g.db = pymysql.connect(
-            host=Config.MYSQL_HOST,
-            user=Config.MYSQL_USER,
-            password=Config.MYSQL_PASSWORD,
-            database=Config.MYSQL_DB,
-            cursorclass=pymysql.cursors.DictCursor,
-        )
+        replica = _pick_replica()
+        if replica is not None:
+            try:
+                g.db = replica.acquire()
+                g.db_pool = replica
+                return g.db
+            except (pymysql.MySQLError, PoolTimeout):
+                retry = current_app.config.get('MYSQL_REPLICA_RETRY_AFTER', Config.MYSQL_REPLICA_RETRY_AFTER)
+                _replica_down[id(replica)] = time.monotonic() + retry
+        g.db = pool.acquire()
+        g.db_pool = pool
     return g.db
 
 def close_db(e=None):
     db = g.pop('db', None)
+    db_pool = g.pop('db_pool', pool)
     if db is not None:
-        db.close()
+        db_pool.release(db)
+
+def _make_pool(cfg, host=None, port=None, connection_class=pymysql.connections.Connection):
+    return ConnectionPool(
+        _connect_kwargs(cfg, host, port),
+        min_size=cfg.get('MYSQL_POOL_MIN', Config.MYSQL_POOL_MIN),
+        max_size=cfg.get('MYSQL_POOL_MAX', Config.MYSQL_POOL_MAX),
+        max_lifetime=cfg.get('MYSQL_POOL_MAX_LIFETIME', Config.MYSQL_POOL_MAX_LIFETIME),
+        timeout=cfg.get('MYSQL_POOL_TIMEOUT', Config.MYSQL_POOL_TIMEOUT),
+        ping_after=cfg.get('MYSQL_POOL_PING_AFTER', Config.MYSQL_POOL_PING_AFTER),
+        connection_class=connection_class,
+    )
 
 def init_db(app):
+    global pool, replica_pools
+    cfg = app.config
+    pool = _make_pool(cfg, connection_class=PrimaryConnection)
+    replica_pools = [_make_pool(cfg, host, port) for host, port in _parse_hosts(cfg.get('MYSQL_REPLICAS', Config.MYSQL_REPLICAS))]
     app.teardown_appcontext(close_db)
+    init_db_stats(app)
 
 class MySQL:
     """Wrapper so existing code using mysql.connection.cursor() still works."""
@@ -0,0 +1,119 @@
+# FarmIntel - Per-request query instrumentation: count, DB time, slow-query log, repeated statements (N+1)
+import json
+import logging
+import time
+from collections import Counter
+import pymysql.cursors
+from flask import g, request, current_app, has_request_context
+from config import Config
+
+logger = logging.getLogger('farmintel.sql')
+
+def _shape(query):
+    """Statement shape = the parameterised SQL with whitespace collapsed (values are bound separately)."""
+    if isinstance(query, bytes):
+        query = query.decode('utf-8', 'replace')
+    return ' '.join(query.split())
+
+class QueryStats:
+    """Queries issued while handling one request."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_sql = None
+        self.shapes = Counter()
+
+    def record(self, sql, elapsed):
+        self.count += 1
+        self.total += elapsed
+        self.shapes[sql] += 1
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+            self.slowest_sql = sql
+
+def _cfg(key):
+    return current_app.config.get(key, getattr(Config, key))
+
+def _record(query, elapsed):
+    if not has_request_context():
+        return
+    stats = g.get('query_stats')
+    if stats is None:
+        stats = g.query_stats = QueryStats()
+    sql = _shape(query)
+    stats.record(sql, elapsed)
+    ms = elapsed * 1000
+    if ms >= _cfg('SLOW_QUERY_MS'):
+        logger.warning(json.dumps({
+            'event': 'slow_query',
+            'ms': round(ms, 2),
+            'endpoint': request.endpoint,
+            'path': request.path,
+            'sql': sql,
+        }))
+
+class _Instrumented:
+    """Mixin timing execute()/executemany(); executemany counts as one statement."""
+    _many = False
+
+    def execute(self, query, args=None):
+        if self._many:
+            return super().execute(query, args)
+        start = time.perf_counter()
+        try:
+            return super().execute(query, args)
+        finally:
+            _record(query, time.perf_counter() - start)
+
+    def executemany(self, query, args):
+        start = time.perf_counter()
+        self._many = True
+        try:
+            return super().executemany(query, args)
+        finally:
+            self._many = False
+            _record(query, time.perf_counter() - start)
+
+class InstrumentedCursor(_Instrumented, pymysql.cursors.DictCursor):
+    pass
+
+class InstrumentedSSCursor(_Instrumented, pymysql.cursors.SSDictCursor):
+    """Unbuffered: rows are read from the server as they are iterated. Use for large exports,
+    and close it (which drains any unread rows) before running another query on the connection."""
+
+def _after_request(response):
+    stats = g.get('query_stats')
+    if stats is None:
+        return response
+    total_ms = stats.total * 1000
+    if _cfg('DB_SERVER_TIMING'):
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={total_ms:.2f};desc="{stats.count} queries", db-slowest;dur={stats.slowest * 1000:.2f}',
+        )
+    threshold = _cfg('N_PLUS_ONE_THRESHOLD')
+    repeated = [(sql, n) for sql, n in stats.shapes.items() if n >= threshold]
+    for sql, n in repeated:
+        logger.warning(json.dumps({
+            'event': 'repeated_query',
+            'count': n,
+            'endpoint': request.endpoint,
+            'path': request.path,
+            'sql': sql,
+        }))
+    if total_ms >= _cfg('SLOW_REQUEST_DB_MS'):
+        logger.warning(json.dumps({
+            'event': 'slow_request_db',
+            'ms': round(total_ms, 2),
+            'queries': stats.count,
+            'endpoint': request.endpoint,
+            'path': request.path,
+            'slowest_ms': round(stats.slowest * 1000, 2),
+            'slowest_sql': stats.slowest_sql,
+        }))
+    return response
+
+def init_db_stats(app):
+    app.after_request(_after_request)
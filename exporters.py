@@ -0,0 +1,352 @@
+# FarmIntel - Reports exporter: financial records, orders and products streamed as CSV, JSON Lines or XLSX
+import csv
+import io
+import json
+import logging
+import os
+import re
+import time
+import zipfile
+import zlib
+from contextlib import closing
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+from xml.sax.saxutils import escape
+from config import Config
+from db_stats import InstrumentedSSCursor
+import jobs
+
+logger = logging.getLogger('farmintel.exporters')
+
+CHUNK = 64 * 1024  # bytes collected before a chunk is sent or written
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'xlsx': ('application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'xlsx'),
+}
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _text(limit):
+    return lambda v: v.strip()[:limit]
+
+def _day(v):
+    return date.fromisoformat(v)
+
+def _day_after(v):
+    return date.fromisoformat(v) + timedelta(days=1)
+
+def _prefix(v):
+    return _like_escape(v.strip()[:50]) + '%'
+
+# name -> title, columns [(key, header)], query ({where} is filled in), filters: name -> (SQL, converter).
+# Filters take plain strings, so the same dict works for request.args and a JSON job payload.
+REPORTS = {
+    'financial': {
+        'title': 'Financial records',
+        'columns': [
+            ('crop_name', 'Crop Name'), ('season', 'Season'), ('seeds_cost', 'Seeds Cost'),
+            ('fertilizer_cost', 'Fertilizer Cost'), ('pesticides_cost', 'Pesticides Cost'),
+            ('irrigation_cost', 'Irrigation Cost'), ('labour_cost', 'Labour Cost'), ('machinery_cost', 'Machinery Cost'),
+            ('other_expenses', 'Other Expenses'), ('total_expense', 'Total Expense'),
+            ('total_production', 'Total Production'), ('selling_price', 'Selling Price'), ('total_income', 'Total Income'),
+            ('net_profit', 'Net Profit'), ('status', 'Status'), ('created_at', 'Created At'),
+        ],
+        'sql': 'SELECT * FROM financial_records WHERE {where} ORDER BY created_at DESC, id DESC',
+        'filters': {
+            'farmer_id': ('farmer_id = %s', int),
+            'crop': ('crop_name = %s', _text(150)),
+            'from': ('created_at >= %s', _day),
+            'to': ('created_at < %s', _day_after),
+            'season': ('season LIKE %s', _prefix),
+        },
+    },
+    'orders': {
+        'title': 'Orders with items',
+        'columns': [
+            ('order_id', 'Order ID'), ('order_date', 'Order Date'), ('farmer', 'Farmer'), ('district', 'District'),
+            ('status', 'Status'), ('product_id', 'Product ID'), ('product_name', 'Product'), ('quantity', 'Quantity'),
+            ('price_per_unit', 'Price Per Unit'), ('gst_rate', 'GST %'), ('gst_amount', 'GST Amount'),
+            ('order_total', 'Order Total'),
+        ],
+        'sql': '''SELECT o.id AS order_id, o.order_date, u.name AS farmer, u.district, o.status, oi.product_id,
+                         COALESCE(oi.product_name, p.name) AS product_name, oi.quantity, oi.price_per_unit,
+                         oi.gst_rate, oi.gst_amount, o.total AS order_total
+                  FROM orders o
+                  JOIN order_items oi ON oi.order_id = o.id
+                  JOIN users u ON u.id = o.farmer_id
+                  LEFT JOIN products p ON p.id = oi.product_id
+                  WHERE {where} ORDER BY o.id, oi.id''',
+        'filters': {
+            'farmer_id': ('o.farmer_id = %s', int),
+            'from': ('o.order_date >= %s', _day),
+            'to': ('o.order_date < %s', _day_after),
+        },
+    },
+    'products': {
+        'title': 'Product inventory',
+        'columns': [
+            ('id', 'ID'), ('sku', 'SKU'), ('name', 'Name'), ('category', 'Category'), ('brand', 'Brand'),
+            ('price', 'Price'), ('discount', 'Discount %'), ('stock', 'Stock'), ('created_at', 'Created At'),
+        ],
+        'sql': '''SELECT id, sku, name, category, brand, price, discount, stock, created_at
+                  FROM products WHERE {where} ORDER BY id''',
+        'filters': {
+            'category': ('category = %s', _text(50)),
+        },
+    },
+}
+
+def where(report, filters):
+    """WHERE clause and params for ``report`` from a dict of filter values; empty and malformed
+    values are ignored (as with ``request.args.get(..., type=...)``), unknown keys too."""
+    clauses, params = [], []
+    for name, (sql, convert) in REPORTS[report]['filters'].items():
+        value = filters.get(name)
+        if value is None or str(value).strip() == '':
+            continue
+        try:
+            params.append(convert(str(value)))
+        except ValueError:
+            continue
+        clauses.append(sql)
+    return ' AND '.join(clauses) or 'TRUE', params
+
+def rows(conn, report, filters):
+    """The report's rows as dicts, read from an unbuffered (server-side) cursor one at a time."""
+    clause, params = where(report, filters)
+    cur = conn.cursor(InstrumentedSSCursor)
+    try:
+        cur.execute(REPORTS[report]['sql'].format(where=clause), params)
+        yield from cur
+    finally:
+        cur.close()
+
+def filename(base, fmt, gzip=False):
+    name = f'{base}.{FORMATS[fmt][1]}'
+    return name + '.gz' if gzip and fmt != 'xlsx' else name
+
+def mimetype(fmt, gzip=False):
+    return 'application/gzip' if gzip and fmt != 'xlsx' else FORMATS[fmt][0]
+
+# ---------- Writers: each turns (columns, rows) into text or bytes chunks ----------
+
+def _csv_value(v):
+    return '' if v is None else v
+
+def _csv(columns, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow([label for _, label in columns])
+    for r in rows:
+        writer.writerow([_csv_value(r.get(k)) for k, _ in columns])
+        if buf.tell() >= CHUNK:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+def _json_value(v):
+    if isinstance(v, Decimal):
+        return float(v)
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()
+    raise TypeError(f'{type(v).__name__} is not JSON serializable')
+
+def _jsonl(columns, rows):
+    parts, size = [], 0
+    for r in rows:
+        line = json.dumps({k: r.get(k) for k, _ in columns}, default=_json_value, ensure_ascii=False) + '\n'
+        parts.append(line)
+        size += len(line)
+        if size >= CHUNK:
+            yield ''.join(parts)
+            parts, size = [], 0
+    yield ''.join(parts)
+
+# Minimal SpreadsheetML package: one sheet, inline strings (no shared-strings table to hold in
+# memory), numbers as numbers. Enough for Excel, LibreOffice and openpyxl.
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="{title}" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'),
+}
+_SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_TAIL = '</sheetData></worksheet>'
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _xlsx_cell(v):
+    if v is None:
+        return '<c/>'
+    if isinstance(v, (int, float, Decimal)) and not isinstance(v, bool):
+        return f'<c><v>{v}</v></c>'
+    if isinstance(v, datetime):
+        v = v.strftime('%Y-%m-%d %H:%M:%S')
+    text = escape(_XML_ILLEGAL.sub('', str(v)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+def _xlsx_row(values):
+    return '<row>' + ''.join(_xlsx_cell(v) for v in values) + '</row>'
+
+class _Sink:
+    """Write-only file for zipfile: collects the compressed bytes until they are taken."""
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._parts)
+        self._parts.clear()
+        return data
+
+def _xlsx(columns, rows, title):
+    """XLSX bytes written as the rows arrive. zipfile writes to a non-seekable sink using data
+    descriptors, and the sheet is deflated as it goes, so memory stays at about one chunk."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, xml in _XLSX_PARTS.items():
+            zf.writestr(name, xml.replace('{title}', escape(title)))
+        with zf.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            parts, size = [_SHEET_HEAD, _xlsx_row(label for _, label in columns)], 0
+            for r in rows:
+                row = _xlsx_row(r.get(k) for k, _ in columns)
+                parts.append(row)
+                size += len(row)
+                if size >= CHUNK:
+                    sheet.write(''.join(parts).encode('utf-8'))
+                    parts, size = [], 0
+                    yield sink.take()
+            parts.append(_SHEET_TAIL)
+            sheet.write(''.join(parts).encode('utf-8'))
+    yield sink.take()
+
+def _gzipped(chunks):
+    z = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        data = z.compress(chunk)
+        if data:
+            yield data
+    yield z.flush()
+
+def stream(conn, report, filters, fmt, gzip=False):
+    """The report as bytes chunks in ``fmt`` (a FORMATS key), optionally gzipped (not for XLSX,
+    which is a zip already). Rows are read and written one at a time, so memory use does not grow
+    with the size of the export."""
+    columns = REPORTS[report]['columns']
+    data = rows(conn, report, filters)
+    if fmt == 'xlsx':
+        return _xlsx(columns, data, REPORTS[report]['title'])
+    text = _csv(columns, data) if fmt == 'csv' else _jsonl(columns, data)
+    chunks = (t.encode('utf-8') for t in text)
+    return _gzipped(chunks) if gzip else chunks
+
+# ---------- Background exports (admin): written to EXPORT_FOLDER and downloaded from there ----------
+
+def export_path(name):
+    return Path(Config.EXPORT_FOLDER) / Path(name).name
+
+def _partial_path(name):
+    # Kept out of EXPORT_FOLDER itself, so neither the sweep nor the download route ever sees them
+    return Path(Config.EXPORT_FOLDER) / 'partial' / (Path(name).name + '.part')
+
+def export_state(name):
+    """'ready', 'writing' or None (not started, failed or swept) for an export file name."""
+    if export_path(name).is_file():
+        return 'ready'
+    return 'writing' if _partial_path(name).is_file() else None
+
+def enqueue_export(cur, report, fmt, filters, gzip=False):
+    """Queue a background export; returns the file name it will have in EXPORT_FOLDER."""
+    stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+    name = filename(f'{report}-{stamp}-{os.urandom(4).hex()}', fmt, gzip)
+    jobs.enqueue(cur, 'export', {'report': report, 'format': fmt, 'gzip': gzip, 'filters': filters, 'file': name})
+    return name
+
+def _claim(tmp):
+    """Create the export's .part file exclusively; None if another run of the job is writing it.
+    A .part still growing (mtime within JOB_STALE_SECONDS) has a live writer; an older one was left
+    by a run that died and is replaced."""
+    try:
+        return os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+    except FileExistsError:
+        try:
+            if time.time() - tmp.stat().st_mtime < Config.JOB_STALE_SECONDS:
+                return None
+            tmp.unlink()
+        except FileNotFoundError:
+            pass
+        return os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+
+@jobs.handler('export')
+def export_job(conn, payload):
+    path = export_path(payload['file'])
+    if path.is_file():
+        return  # an earlier run already finished it
+    tmp = _partial_path(payload['file'])
+    tmp.parent.mkdir(parents=True, exist_ok=True)
+    fd = _claim(tmp)
+    if fd is None:
+        logger.warning('Export %s is already being written by another run; skipping', path.name)
+        return
+    # Renamed into place when complete, so the download link only appears for whole files
+    try:
+        with os.fdopen(fd, 'wb') as out, closing(stream(conn, payload['report'], payload['filters'],
+                                                         payload['format'], payload['gzip'])) as chunks:
+            for chunk in chunks:
+                out.write(chunk)
+        os.replace(tmp, path)
+    except BaseException:
+        if tmp.exists():
+            tmp.unlink()
+        raise
+    conn.commit()  # end the read transaction
+    logger.info('Export %s written (%s bytes)', path.name, path.stat().st_size)
+
+@jobs.periodic
+def _sweep(conn):
+    """Delete finished exports older than EXPORT_RETENTION_HOURS. Files still being written live
+    in the partial/ subdirectory and are never touched."""
+    folder = Path(Config.EXPORT_FOLDER)
+    if not folder.is_dir():
+        return
+    cutoff = time.time() - Config.EXPORT_RETENTION_HOURS * 3600
+    for path in folder.iterdir():
+        try:
+            if path.is_file() and path.stat().st_mtime < cutoff:
+                path.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,116 @@
+# FarmIntel - Financial records import: a farmer's season ledger from CSV/XLSX, idempotent per batch key
+from decimal import Decimal
+import pymysql
+from config import Config
+from validators import validate_crop_name, validate_positive_number
+from spreadsheet import iter_rows
+
+REQUIRED = ('crop_name',)
+# Number columns and the labels used in error messages (as on the add-record form)
+AMOUNTS = {
+    'seeds_cost': 'Seeds cost',
+    'fertilizer_cost': 'Fertilizer cost',
+    'pesticides_cost': 'Pesticides cost',
+    'irrigation_cost': 'Irrigation cost',
+    'labour_cost': 'Labour cost',
+    'machinery_cost': 'Machinery cost',
+    'other_expenses': 'Other expenses',
+    'total_production': 'Total production',
+    'selling_price': 'Selling price',
+}
+COLUMNS = REQUIRED + ('season',) + tuple(AMOUNTS)
+MAX_AMOUNT = Decimal('9999999999.99')  # the amount columns are DECIMAL(12,2)
+
+# A row already imported under the same batch and row number is left alone, so uploading the
+# same file again with the same batch key (after a timeout, or twice by mistake) adds nothing
+INSERT = f'''INSERT INTO financial_records (farmer_id, import_batch_id, source_row, crop_name, season, {", ".join(AMOUNTS)})
+             VALUES (%s, %s, %s, %s, %s, {", ".join(["%s"] * len(AMOUNTS))})
+             ON DUPLICATE KEY UPDATE id = id'''
+
+def _validate(row):
+    """(values after farmer/batch/row, None) or (None, [error messages]) for one spreadsheet row."""
+    errors = []
+    ok, err = validate_crop_name(row['crop_name'])
+    if not ok:
+        errors.append(err)
+    if len(row.get('season', '')) > 50:
+        errors.append('Season must be at most 50 characters.')
+    for column, label in AMOUNTS.items():
+        ok, err = validate_positive_number(row.get(column), label, required=False)
+        if not ok:
+            errors.append(err)
+        elif row.get(column) and not (Decimal(row[column]).is_finite() and Decimal(row[column]) <= MAX_AMOUNT):
+            # 'inf' and 1e20 pass the form validator but not the column
+            errors.append(f'{label} must be a number up to {MAX_AMOUNT}.')
+    if errors:
+        return None, errors
+    return (row['crop_name'], row.get('season') or None,
+            *(Decimal(row.get(c) or 0) for c in AMOUNTS)), None
+
+def _batch(cur, farmer_id, batch_key, filename):
+    cur.execute('''INSERT INTO import_batches (farmer_id, batch_key, filename) VALUES (%s, %s, %s)
+                   ON DUPLICATE KEY UPDATE id = id''', (farmer_id, batch_key, filename[:255]))
+    cur.execute('SELECT * FROM import_batches WHERE farmer_id = %s AND batch_key = %s', (farmer_id, batch_key))
+    return cur.fetchone()
+
+def import_records(conn, farmer_id, batch_key, f):
+    """Insert the valid rows of an uploaded CSV/XLSX as the farmer's financial records.
+
+    Rows are streamed and inserted IMPORT_BATCH_SIZE at a time, each chunk committed on its own;
+    invalid rows are reported and skipped without stopping the rest. ``batch_key`` makes the upload
+    idempotent: a finished batch is never imported twice, and an interrupted one resumes, skipping
+    rows it already inserted. A chunk the database rejects is rolled back and reported, and the
+    batch stays open so the same key retries it. Returns a report dict: ``imported`` (new rows),
+    ``skipped`` (rows already there), ``failed``, ``errors`` ([(row number, crop, messages)], capped
+    at IMPORT_MAX_ERRORS), ``chunks_failed`` and ``already_done`` (the batch had finished before).
+    Raises SpreadsheetError if the file itself is unreadable.
+    """
+    report = {'imported': 0, 'skipped': 0, 'failed': 0, 'errors': [], 'chunks_failed': 0, 'already_done': False}
+    cur = conn.cursor()
+    try:
+        batch = _batch(cur, farmer_id, batch_key, f.filename or '')
+        conn.commit()
+        if batch['status'] == 'done':
+            report.update(imported=batch['imported'], failed=batch['failed'], already_done=True)
+            return report
+        pending = []
+
+        def flush():
+            try:
+                inserted = cur.executemany(INSERT, pending)
+                conn.commit()
+            except pymysql.MySQLError as e:
+                conn.rollback()
+                report['failed'] += len(pending)
+                report['chunks_failed'] += 1
+                report['errors'].append((f'{pending[0][2]}–{pending[-1][2]}', None,
+                                         [f'Not saved, the database rejected these rows: {e}']))
+            else:
+                report['imported'] += inserted
+                report['skipped'] += len(pending) - inserted
+            pending.clear()
+
+        for number, row in iter_rows(f, required=REQUIRED):
+            values, errors = _validate(row)
+            if errors:
+                report['failed'] += 1
+                if len(report['errors']) < Config.IMPORT_MAX_ERRORS:
+                    report['errors'].append((number, row['crop_name'], errors))
+                continue
+            pending.append((farmer_id, batch['id'], number, *values))
+            if len(pending) >= Config.IMPORT_BATCH_SIZE:
+                flush()
+        if pending:
+            flush()
+        if report['chunks_failed']:
+            return report
+        cur.execute('''UPDATE import_batches SET status = 'done', failed = %s, finished_at = NOW(),
+                           imported = (SELECT COUNT(*) FROM financial_records WHERE import_batch_id = %s)
+                       WHERE id = %s''', (report['failed'], batch['id'], batch['id']))
+        conn.commit()
+    except BaseException:
+        conn.rollback()  # only the unfinished chunk; committed ones are kept and skipped on a retry
+        raise
+    finally:
+        cur.close()
+    return report
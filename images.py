@@ -0,0 +1,149 @@
+# FarmIntel - Upload image variants: resized thumbnail/card/detail copies in WebP + JPEG fallback
+import json
+from pathlib import Path
+import click
+from config import Config
+from catalog_cache import catalog
+import db
+import jobs
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow missing: originals are stored and served as before
+    Image = None
+
+def make_variants(path, rel_path):
+    """Write resized, metadata-free WebP and JPEG copies of the image at ``path``.
+
+    Files go to a ``variants/`` folder next to the original. Returns
+    ``{'thumb': {'w': 160, 'webp': 'uploads/.../x.thumb.webp', 'jpg': ...}, 'card': ..., 'detail': ...}``
+    with paths relative to ``static/`` (as stored in the DB), or ``{}`` when the file
+    cannot be decoded or Pillow is not installed. Sizes wider than the original are skipped
+    (the smallest is always produced), so images are never upscaled. Existing variant files are
+    kept: uploads are content-addressed, so a file of the same name was built from the same bytes.
+    """
+    if Image is None:
+        return {}
+    path = Path(path)
+    rel_dir = rel_path.rsplit('/', 1)[0]
+    out_dir = path.parent / 'variants'
+    out_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        with Image.open(path) as src:
+            im = ImageOps.exif_transpose(src)
+            im = im.convert('RGBA' if _has_alpha(im) else 'RGB')
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return {}
+    flat = im
+    if im.mode == 'RGBA':  # JPEG has no alpha: flatten onto white
+        flat = Image.new('RGB', im.size, (255, 255, 255))
+        flat.paste(im, mask=im.getchannel('A'))
+    variants = {}
+    widths = sorted(Config.IMAGE_VARIANT_WIDTHS.items(), key=lambda kv: kv[1])
+    for i, (name, width) in enumerate(widths):
+        if width > im.width and i > 0:
+            break
+        w = min(width, im.width)
+        h = max(1, round(im.height * w / im.width))
+        stem = f'{path.stem}.{name}'
+        # Saved without exif/icc/xmp arguments, so camera metadata (GPS etc.) is dropped
+        if not (out_dir / f'{stem}.webp').exists():
+            im.resize((w, h), Image.LANCZOS).save(out_dir / f'{stem}.webp', 'WEBP', quality=Config.IMAGE_WEBP_QUALITY, method=4)
+        if not (out_dir / f'{stem}.jpg').exists():
+            flat.resize((w, h), Image.LANCZOS).save(out_dir / f'{stem}.jpg', 'JPEG', quality=Config.IMAGE_JPEG_QUALITY,
+                                                    optimize=True, progressive=True)
+        variants[name] = {'w': w, 'webp': f'{rel_dir}/variants/{stem}.webp', 'jpg': f'{rel_dir}/variants/{stem}.jpg'}
+    return variants
+
+def _has_alpha(im):
+    return im.mode in ('RGBA', 'LA') or (im.mode == 'P' and 'transparency' in im.info)
+
+def enqueue_variants(cur, table, row_id, paths):
+    """Queue variant generation for new uploads of a crops/products row. The row's
+    images_processing counter must already include len(paths); the job decrements it."""
+    jobs.enqueue(cur, 'image_variants', {'table': table, 'id': row_id, 'paths': paths})
+
+def refresh_crop_cover(cur, crop_id):
+    """Copy the first crop_images row into crops.cover_image/cover_variants (used by list cards)."""
+    cur.execute('''UPDATE crops SET
+                     cover_image = (SELECT path FROM crop_images WHERE crop_id = %s ORDER BY position LIMIT 1),
+                     cover_variants = (SELECT variants FROM crop_images WHERE crop_id = %s ORDER BY position LIMIT 1)
+                   WHERE id = %s''', (crop_id, crop_id, crop_id))
+
+def _invalidate(table, row_id):
+    catalog.invalidate(f'{table}.list')
+    catalog.invalidate(f'{table}.detail', row_id)
+
+def _variants_failed(conn, payload):
+    # Give up on variants but stop showing the placeholder: pages fall back to the originals
+    table = 'crops' if payload['table'] == 'crops' else 'products'
+    cur = conn.cursor()
+    cur.execute(f'UPDATE {table} SET images_processing = GREATEST(images_processing - %s, 0) WHERE id = %s',
+                (len(payload['paths']), payload['id']))
+    cur.close()
+    _invalidate(table, payload['id'])
+
+@jobs.handler('image_variants', on_failure=_variants_failed)
+def build_variants_job(conn, payload):
+    static = Path(Config.UPLOAD_FOLDER).parent
+    built = {p: make_variants(static / p, p) for p in payload['paths']}
+    row_id = payload['id']
+    cur = conn.cursor()
+    if payload['table'] == 'crops':
+        cur.executemany('UPDATE crop_images SET variants = %s WHERE crop_id = %s AND path = %s',
+                        [(json.dumps(v), row_id, p) for p, v in built.items() if v])
+        cur.execute('UPDATE crops SET images_processing = GREATEST(images_processing - %s, 0) WHERE id = %s',
+                    (len(payload['paths']), row_id))
+        refresh_crop_cover(cur, row_id)
+        table = 'crops'
+    else:
+        path, variants = next(iter(built.items()))
+        # Attach only if the product still shows this image (it may have been replaced meanwhile)
+        cur.execute('''UPDATE products SET image_variants = IF(image_path = %s, %s, image_variants),
+                       images_processing = GREATEST(images_processing - 1, 0) WHERE id = %s''',
+                    (path, json.dumps(variants) if variants else None, row_id))
+        table = 'products'
+    conn.commit()
+    cur.close()
+    _invalidate(table, row_id)
+
+def load_variants(value):
+    """Parse an ``image_variants`` JSON column (tolerates NULL and bad data)."""
+    if not value:
+        return {}
+    try:
+        data = json.loads(value) if isinstance(value, str) else value
+        return data if isinstance(data, dict) else {}
+    except ValueError:
+        return {}
+
+@click.command('image-variants')
+def image_variants_command():
+    """Generate missing image variants for existing crop and product uploads."""
+    static = Path(Config.UPLOAD_FOLDER).parent
+    conn = db.pool.acquire()
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT id, crop_id, path FROM crop_images WHERE variants IS NULL ORDER BY crop_id, position')
+        crop_ids = set()
+        for row in cur.fetchall():
+            if (static / row['path']).is_file():
+                variants = make_variants(static / row['path'], row['path'])
+                cur.execute('UPDATE crop_images SET variants = %s WHERE id = %s', (json.dumps(variants), row['id']))
+                crop_ids.add(row['crop_id'])
+                click.echo(f'crop {row["crop_id"]}: {row["path"]}')
+        for crop_id in crop_ids:
+            refresh_crop_cover(cur, crop_id)
+        cur.execute('SELECT id, image_path FROM products WHERE image_path IS NOT NULL AND image_variants IS NULL')
+        for row in cur.fetchall():
+            if (static / row['image_path']).is_file():
+                variants = make_variants(static / row['image_path'], row['image_path'])
+                cur.execute('UPDATE products SET image_variants = %s WHERE id = %s', (json.dumps(variants), row['id']))
+                click.echo(f'product {row["id"]}')
+        conn.commit()
+        cur.close()
+    finally:
+        db.pool.release(conn)
+
+def init_images(app):
+    app.cli.add_command(image_variants_command)
@@ -0,0 +1,60 @@
+# FarmIntel - Invoice documents: rendered once per order to instance/invoices/<farmer_id>/<order_id>.html
+import logging
+import os
+import tempfile
+from pathlib import Path
+from flask import render_template
+from config import Config
+from db import mysql
+from pricing import order_pricing
+
+logger = logging.getLogger('farmintel.invoices')
+
+# users columns copied onto each order at checkout as buyer_<field>
+BUYER_FIELDS = ('name', 'mobile', 'village', 'taluka', 'district')
+
+def invoice_path(farmer_id, order_id):
+    return Path(Config.INVOICE_FOLDER) / str(int(farmer_id)) / f'{int(order_id)}.html'
+
+def render_invoice(farmer_id, order_id):
+    """Write the invoice document for one of the farmer's orders; returns its path, or None if
+    the farmer has no such order.
+
+    Everything on it comes from what checkout stored (order totals, the buyer snapshot,
+    order_items names, prices and GST), so the file never needs re-rendering: later views are
+    plain file responses.
+    """
+    cur = mysql.connection.cursor()
+    cur.execute('SELECT * FROM orders WHERE id = %s AND farmer_id = %s', (order_id, farmer_id))
+    order = cur.fetchone()
+    if not order:
+        cur.close()
+        return None
+    cur.execute('''SELECT quantity, price_per_unit, gst_rate, gst_amount, product_name AS name
+                   FROM order_items WHERE order_id = %s ORDER BY id''', (order_id,))
+    items = cur.fetchall()
+    cur.close()
+    farmer = {f: order[f'buyer_{f}'] for f in BUYER_FIELDS}
+    html = render_template('farmer/invoice_document.html', order=order, farmer=farmer,
+                           pricing=order_pricing(order, items))
+    path = invoice_path(farmer_id, order_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write-then-rename, so a concurrent view never serves a half-written file
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix='.part')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as out:
+            out.write(html)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    return path
+
+def render_after_checkout(farmer_id, order_id):
+    """Render a just-committed order's invoice. A failure is only logged: the order stands, and
+    the invoice view renders the file on first request instead."""
+    try:
+        render_invoice(farmer_id, order_id)
+    except Exception:
+        logger.exception('Invoice for order %s could not be rendered at checkout', order_id)
@@ -0,0 +1,186 @@
+# FarmIntel - Local background jobs: durable records in the `jobs` table, run by a thread pool
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from flask import g
+from config import Config
+import db
+
+logger = logging.getLogger('farmintel.jobs')
+
+_handlers = {}      # kind -> (fn(conn, payload), on_failure(conn, payload) or None)
+_periodic = []      # fn(conn) run by the poller every JOB_POLL_SECONDS
+_running = set()    # ids of the jobs running in this process; their heartbeat is kept fresh
+_executor = None
+_poller = None
+_heart = None
+_lock = threading.Lock()
+
+def handler(kind, on_failure=None):
+    """Register ``fn(conn, payload)`` to run jobs of ``kind``. ``on_failure`` runs once the
+    job has used up JOB_MAX_ATTEMPTS. Handlers commit their own work on ``conn``."""
+    def register(fn):
+        _handlers[kind] = (fn, on_failure)
+        return fn
+    return register
+
+def periodic(fn):
+    """Register ``fn(conn)`` to run in every worker's poller each JOB_POLL_SECONDS (housekeeping
+    such as sweeps; it must be safe to run concurrently and commits its own work)."""
+    _periodic.append(fn)
+    return fn
+
+def enqueue(cur, kind, payload):
+    """Record a job in the caller's transaction; it is dispatched after the request ends.
+    If the request never commits, the job row disappears with the rollback and nothing runs."""
+    cur.execute('INSERT INTO jobs (kind, payload) VALUES (%s, %s)', (kind, json.dumps(payload)))
+    job_id = cur.lastrowid
+    g.setdefault('pending_jobs', []).append(job_id)
+    return job_id
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=Config.JOB_WORKERS, thread_name_prefix='farmintel-job')
+        return _executor
+
+def dispatch(job_id):
+    _get_executor().submit(_run, job_id)
+
+def _run(job_id):
+    conn = db.pool.acquire()
+    try:
+        with closing(conn.cursor()) as cur:
+            # Claim atomically: another worker process (or the poller) may have taken it already
+            cur.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, started_at = NOW(), "
+                        "heartbeat_at = NOW() WHERE id = %s AND status = 'queued'", (job_id,))
+            conn.commit()
+            if cur.rowcount == 0:
+                return
+            with _lock:
+                _running.add(job_id)
+            try:
+                _execute(conn, cur, job_id)
+            finally:
+                with _lock:
+                    _running.discard(job_id)
+    except Exception:
+        logger.exception('Job %s could not be run', job_id)
+    finally:
+        db.pool.release(conn)
+
+def _execute(conn, cur, job_id):
+    cur.execute('SELECT kind, payload, attempts FROM jobs WHERE id = %s', (job_id,))
+    job = cur.fetchone()
+    fn, on_failure = _handlers.get(job['kind'], (None, None))
+    payload = json.loads(job['payload'] or '{}')
+    try:
+        if fn is None:
+            raise LookupError(f'No handler registered for job kind {job["kind"]!r}.')
+        fn(conn, payload)
+    except Exception as exc:
+        conn.rollback()
+        logger.exception('Job %s (%s) failed, attempt %s', job_id, job['kind'], job['attempts'])
+        final = job['attempts'] >= Config.JOB_MAX_ATTEMPTS
+        cur.execute('UPDATE jobs SET status = %s, error = %s, finished_at = NOW() WHERE id = %s',
+                    ('failed' if final else 'queued', str(exc)[:2000], job_id))
+        conn.commit()
+        if not final:
+            threading.Timer(Config.JOB_RETRY_DELAY * job['attempts'], dispatch, (job_id,)).start()
+        elif on_failure:
+            on_failure(conn, payload)
+            conn.commit()
+        return
+    cur.execute("UPDATE jobs SET status = 'done', error = NULL, finished_at = NOW() WHERE id = %s", (job_id,))
+    conn.commit()
+
+def _beat():
+    """Every JOB_HEARTBEAT_SECONDS, mark this process's running jobs as alive. Its own thread, so
+    a slow periodic task in the poller never makes a live job look abandoned."""
+    while True:
+        time.sleep(Config.JOB_HEARTBEAT_SECONDS)
+        with _lock:
+            running = sorted(_running)
+        if not running:
+            continue
+        try:
+            conn = db.pool.acquire()
+        except Exception:
+            logger.warning('Job heartbeat could not get a DB connection; retrying later.')
+            continue
+        try:
+            with closing(conn.cursor()) as cur:
+                cur.execute('UPDATE jobs SET heartbeat_at = NOW() WHERE id IN %s', (running,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception('Job heartbeat failed')
+        finally:
+            db.pool.release(conn)
+
+def _poll():
+    """Pick up jobs left queued by a restart, and requeue 'running' jobs whose process stopped
+    sending heartbeats (it died); a slow job in a live process is left alone."""
+    while True:
+        time.sleep(Config.JOB_POLL_SECONDS)
+        try:
+            conn = db.pool.acquire()
+        except Exception:
+            logger.warning('Job poller could not get a DB connection; retrying later.')
+            continue
+        try:
+            cur = conn.cursor()
+            cur.execute("UPDATE jobs SET status = 'queued' WHERE status = 'running' "
+                        "AND heartbeat_at < NOW() - INTERVAL %s SECOND", (Config.JOB_STALE_SECONDS,))
+            cur.execute("SELECT id FROM jobs WHERE status = 'queued' AND created_at < NOW() - INTERVAL %s SECOND "
+                        "ORDER BY id LIMIT 100", (Config.JOB_POLL_SECONDS,))
+            ids = [r['id'] for r in cur.fetchall()]
+            conn.commit()
+            cur.close()
+        except Exception:
+            logger.exception('Job poller failed')
+            ids = []
+        finally:
+            db.pool.release(conn)
+        for job_id in ids:
+            dispatch(job_id)
+        for fn in _periodic:
+            _run_periodic(fn)
+
+def _run_periodic(fn):
+    try:
+        conn = db.pool.acquire()
+    except Exception:
+        return
+    try:
+        fn(conn)
+    except Exception:
+        conn.rollback()
+        logger.exception('Periodic task %s failed', fn.__name__)
+    finally:
+        db.pool.release(conn)
+
+def _start_poller():
+    global _poller, _heart
+    if _poller is not None:
+        return
+    with _lock:
+        if _poller is None:
+            _heart = threading.Thread(target=_beat, name='farmintel-job-heartbeat', daemon=True)
+            _heart.start()
+            _poller = threading.Thread(target=_poll, name='farmintel-job-poller', daemon=True)
+            _poller.start()
+
+def _dispatch_pending(response):
+    for job_id in g.pop('pending_jobs', []):
+        dispatch(job_id)
+    return response
+
+def init_jobs(app):
+    # Threads start on the first request, not at import, so they survive gunicorn's fork
+    app.before_request(_start_poller)
+    app.after_request(_dispatch_pending)
@@ -0,0 +1,59 @@
+# FarmIntel - Store pricing: product discount, quantity tiers and per-category GST in one place
+from decimal import Decimal, ROUND_HALF_UP
+from config import Config
+
+PAISE = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+def _dec(value):
+    return value if isinstance(value, Decimal) else Decimal(str(value or 0))
+
+def _money(value):
+    return value.quantize(PAISE, rounding=ROUND_HALF_UP)
+
+def gst_rate(category):
+    """GST percent for a product category (Config.GST_RATES, else GST_DEFAULT_RATE)."""
+    return _dec(Config.GST_RATES.get(category, Config.GST_DEFAULT_RATE))
+
+def tier_discount(quantity):
+    """Extra percent off for buying at least a tier's quantity; the best matching tier wins."""
+    return max((_dec(pct) for min_qty, pct in Config.QUANTITY_TIERS if quantity >= min_qty), default=Decimal('0'))
+
+def price_lines(items):
+    """Price cart lines (dicts with quantity, price, discount, category) in one pass.
+
+    Returns ``{'lines', 'subtotal', 'gst', 'total', 'gst_slabs'}``. Each line is the input dict plus
+    ``unit_price``, ``tier_discount``, ``amount`` (before GST), ``gst_rate``, ``gst`` and ``line_total``.
+    Every amount is a Decimal rounded to paise, so the figures shown are exactly the ones stored.
+    """
+    lines = []
+    for it in items:
+        qty = int(it['quantity'])
+        tier = tier_discount(qty)
+        unit = _money(_dec(it['price']) * (1 - _dec(it['discount']) / 100) * (1 - tier / 100))
+        amount = unit * qty
+        rate = gst_rate(it.get('category'))
+        gst = _money(amount * rate / 100)
+        lines.append(dict(it, unit_price=unit, tier_discount=tier, amount=amount, gst_rate=rate, gst=gst,
+                          line_total=amount + gst))
+    return _summary(lines)
+
+def order_pricing(order, items):
+    """The same shape as price_lines() for a placed order, from the amounts stored with it
+    (order_items.price_per_unit, gst_rate, gst_amount), so an invoice never re-prices."""
+    lines = [dict(it, unit_price=it['price_per_unit'], amount=it['price_per_unit'] * it['quantity'],
+                  gst=it['gst_amount'], line_total=it['price_per_unit'] * it['quantity'] + it['gst_amount'])
+             for it in items]
+    result = _summary(lines)
+    result.update(subtotal=order['subtotal'], gst=order['gst'], total=order['total'])
+    return result
+
+def _summary(lines):
+    slabs = {}
+    for line in lines:
+        taxable, tax = slabs.get(line['gst_rate'], (ZERO, ZERO))
+        slabs[line['gst_rate']] = (taxable + line['amount'], tax + line['gst'])
+    subtotal = sum((line['amount'] for line in lines), ZERO)
+    gst = sum((line['gst'] for line in lines), ZERO)
+    return {'lines': lines, 'subtotal': subtotal, 'gst': gst, 'total': subtotal + gst,
+            'gst_slabs': [(rate, *slabs[rate]) for rate in sorted(slabs)]}
@@ -0,0 +1,109 @@
+# FarmIntel - Bulk product import: validate spreadsheet rows and upsert them by SKU in batches
+from decimal import Decimal, InvalidOperation
+import pymysql
+from config import Config
+from validators import validate_required_string, validate_positive_number, validate_decimal_range
+from spreadsheet import iter_rows
+
+CATEGORIES = ('Fertilizers', 'Seeds', 'Pesticides', 'Equipment', 'Tools')
+REQUIRED = ('sku', 'name', 'category', 'price')
+COLUMNS = REQUIRED + ('brand', 'description', 'discount', 'stock', 'usage_crops', 'nutrient_composition')
+MAX_PRICE = Decimal('9999999999.99')  # DECIMAL(12,2)
+MAX_STOCK = 2147483647  # INT
+
+# One multi-row statement per batch (PyMySQL expands executemany INSERT ... VALUES); images are
+# never touched, so re-importing a catalog keeps the pictures uploaded through the admin form
+UPSERT = '''INSERT INTO products (sku, name, category, brand, description, price, discount, stock, usage_crops, nutrient_composition)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE name = VALUES(name), category = VALUES(category), brand = VALUES(brand),
+                description = VALUES(description), price = VALUES(price), discount = VALUES(discount),
+                stock = VALUES(stock), usage_crops = VALUES(usage_crops), nutrient_composition = VALUES(nutrient_composition)'''
+
+def _stock(value):
+    """(stock, None) or (None, error message); empty means 0."""
+    try:
+        n = Decimal(value or 0)
+        if not n.is_finite():
+            raise InvalidOperation
+        n = int(n)
+    except (InvalidOperation, ValueError):
+        return None, 'Enter a valid number for Stock.'
+    if not 0 <= n <= MAX_STOCK:
+        return None, f'Stock must be between 0 and {MAX_STOCK}.'
+    return n, None
+
+def _validate(row):
+    """(values for UPSERT, None) or (None, [error messages]) for one spreadsheet row."""
+    checks = [
+        validate_required_string(row['sku'], 'SKU', max_len=64),
+        validate_required_string(row['name'], 'Product name', max_len=200),
+        validate_positive_number(row['price'], 'Price', required=True),
+        validate_decimal_range(row.get('discount'), 'Discount', min_val=0, max_val=100),
+    ]
+    errors = [err for ok, err in checks if not ok]
+    # The form validators let 'inf' and 1e20 through; the columns do not
+    if checks[2][0] and not (Decimal(row['price']).is_finite() and Decimal(row['price']) <= MAX_PRICE):
+        errors.append(f'Price must be a number up to {MAX_PRICE}.')
+    stock, err = _stock(row.get('stock'))
+    if err:
+        errors.append(err)
+    if len(row.get('brand', '')) > 100:
+        errors.append('Brand must be at most 100 characters.')
+    category = next((c for c in CATEGORIES if c.lower() == row['category'].lower()), None)
+    if not category:
+        errors.append(f'Category must be one of: {", ".join(CATEGORIES)}.')
+    if errors:
+        return None, errors
+    return (row['sku'], row['name'], category, row.get('brand') or None, row.get('description') or None,
+            Decimal(row['price']), Decimal(row.get('discount') or 0), stock,
+            row.get('usage_crops') or None, row.get('nutrient_composition') or None), None
+
+def import_products(conn, f):
+    """Upsert every valid row of an uploaded CSV/XLSX into products, keyed by SKU.
+
+    Rows are read and validated one at a time and written IMPORT_BATCH_SIZE at a time, each batch
+    in its own transaction, so memory stays flat however long the file is. Returns a report dict:
+    ``imported`` (rows written), ``failed`` (rows rejected) and ``errors`` ([(row number, sku,
+    messages)], at most IMPORT_MAX_ERRORS of them). A batch the database rejects is rolled back and
+    reported as one error for its row range, and the import goes on with the next batch. Raises
+    SpreadsheetError if the file itself is unreadable; batches committed before that point stay
+    imported.
+    """
+    report = {'imported': 0, 'failed': 0, 'errors': []}
+    batch, numbers = [], []
+    cur = conn.cursor()
+
+    def flush():
+        try:
+            cur.executemany(UPSERT, batch)
+            conn.commit()
+        except pymysql.MySQLError as e:
+            conn.rollback()
+            report['failed'] += len(batch)
+            report['errors'].append((f'{numbers[0]}–{numbers[-1]}', None,
+                                     [f'Not saved, the database rejected these rows: {e}']))
+        else:
+            report['imported'] += len(batch)
+        batch.clear()
+        numbers.clear()
+
+    try:
+        for number, row in iter_rows(f, required=REQUIRED):
+            values, errors = _validate(row)
+            if errors:
+                report['failed'] += 1
+                if len(report['errors']) < Config.IMPORT_MAX_ERRORS:
+                    report['errors'].append((number, row['sku'], errors))
+                continue
+            batch.append(values)
+            numbers.append(number)
+            if len(batch) >= Config.IMPORT_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+    except BaseException:
+        conn.rollback()  # only the unfinished batch; earlier ones are committed
+        raise
+    finally:
+        cur.close()
+    return report
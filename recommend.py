@@ -0,0 +1,135 @@
+# FarmIntel - Crop recommendations: score all active crops against a farmer's profile in one matrix product
+from datetime import date
+from catalog_cache import catalog
+from db import mysql
+
+try:
+    import numpy as np
+except ImportError:  # numpy missing: the dashboard simply shows no recommendations
+    np = None
+
+SEASONS = ('Kharif', 'Rabi', 'Zaid', 'All')
+CATEGORIES = ('Spices', 'Vegetables', 'Pulses', 'Oil Seeds', 'Fruits')
+SOILS = ('black', 'red', 'sandy')
+DEMAND = {'Low': 0.2, 'Medium': 0.6, 'High': 1.0}
+
+# Signup stores soil/water in Gujarati (English accepted too)
+FARMER_SOIL = {'કાળી': 'black', 'લાલ': 'red', 'રેતાળી': 'sandy', 'black': 'black', 'red': 'red', 'sandy': 'sandy'}
+FARMER_WATER = {'ઓછું': 'low', 'મધ્યમ': 'medium', 'વધુ': 'high', 'low': 'low', 'medium': 'medium', 'high': 'high'}
+
+# Words in crops.soil_type that indicate each soil; a crop matching none is treated as adaptable
+SOIL_KEYWORDS = {
+    'black': ('black', 'clay', 'regur', 'heavy'),
+    'red': ('red', 'laterite', 'loam'),
+    'sandy': ('sand', 'light', 'well-drained'),
+}
+
+# Rough water need by category: how well each fits low / medium / high water availability
+WATER_FIT = {
+    'low': {'Pulses': 1.0, 'Oil Seeds': 0.8, 'Spices': 0.6, 'Vegetables': 0.3, 'Fruits': 0.3},
+    'medium': {'Pulses': 0.8, 'Oil Seeds': 0.8, 'Spices': 0.8, 'Vegetables': 0.7, 'Fruits': 0.6},
+    'high': {'Pulses': 0.6, 'Oil Seeds': 0.7, 'Spices': 0.8, 'Vegetables': 1.0, 'Fruits': 1.0},
+}
+
+# Small holdings favour high value per acre, large ones field crops
+LAND_FIT = {
+    'small': {'Vegetables': 1.0, 'Spices': 1.0, 'Fruits': 0.7, 'Pulses': 0.4, 'Oil Seeds': 0.4},
+    'large': {'Vegetables': 0.5, 'Spices': 0.6, 'Fruits': 0.7, 'Pulses': 1.0, 'Oil Seeds': 1.0},
+}
+
+WEIGHTS = {'season': 0.30, 'soil': 0.25, 'water': 0.15, 'demand': 0.15, 'margin': 0.10, 'land': 0.05}
+
+# Feature columns: season one-hot, soil flags (+ 'any'), category one-hot, demand, margin
+_COLUMNS = [f'season:{s}' for s in SEASONS] + [f'soil:{s}' for s in SOILS] + ['soil:any'] \
+    + [f'cat:{c}' for c in CATEGORIES] + ['demand', 'margin']
+_COL = {name: i for i, name in enumerate(_COLUMNS)}
+
+def current_season(today=None):
+    month = (today or date.today()).month
+    if 6 <= month <= 10:
+        return 'Kharif'
+    if month in (4, 5):
+        return 'Zaid'
+    return 'Rabi'
+
+def _soil_flags(soil_type):
+    text = (soil_type or '').lower()
+    flags = [any(k in text for k in SOIL_KEYWORDS[s]) for s in SOILS]
+    return flags + [not any(flags)]
+
+def _margin(market, average):
+    """market vs average price mapped to 0..1 (0.5 = on average, clipped at +/-50%)."""
+    if not market or not average:
+        return 0.5
+    ratio = (float(market) - float(average)) / float(average)
+    return min(max(ratio, -0.5), 0.5) + 0.5
+
+def _load_features():
+    cur = mysql.connection.cursor()
+    cur.execute('SELECT id, category, season, soil_type, india_demand, market_price, average_price FROM crops WHERE active = 1')
+    rows = cur.fetchall()
+    cur.close()
+    features = np.zeros((len(rows), len(_COLUMNS)), dtype=np.float32)
+    for i, r in enumerate(rows):
+        if r['season'] in SEASONS:
+            features[i, _COL[f'season:{r["season"]}']] = 1
+        for soil, flag in zip(SOILS + ('any',), _soil_flags(r['soil_type'])):
+            features[i, _COL[f'soil:{soil}']] = flag
+        if r['category'] in CATEGORIES:
+            features[i, _COL[f'cat:{r["category"]}']] = 1
+        features[i, _COL['demand']] = DEMAND.get(r['india_demand'], 0.4)
+        features[i, _COL['margin']] = _margin(r['market_price'], r['average_price'])
+    return np.array([r['id'] for r in rows], dtype=np.int64), features
+
+def crop_features():
+    """(crop ids, feature matrix) for active crops; rebuilt when an admin edits crops."""
+    return catalog.get_or_load('crops.features', 'active', _load_features)
+
+def _weights(profile, season):
+    """Per-column weights for one farmer, so that features @ weights is each crop's score (0..1)."""
+    w = np.zeros(len(_COLUMNS), dtype=np.float32)
+    w[_COL[f'season:{season}']] = WEIGHTS['season']
+    w[_COL['season:All']] = WEIGHTS['season'] * 0.8
+    soil = FARMER_SOIL.get((profile.get('soil_type') or '').strip())
+    if soil:
+        w[_COL[f'soil:{soil}']] = WEIGHTS['soil']
+        w[_COL['soil:any']] = WEIGHTS['soil'] * 0.5
+    else:
+        w[[_COL[f'soil:{s}'] for s in SOILS + ('any',)]] = WEIGHTS['soil'] * 0.5
+    water = WATER_FIT.get(FARMER_WATER.get((profile.get('water_availability') or '').strip()), {})
+    land_area = float(profile.get('land_area') or 0)
+    land = LAND_FIT['small' if land_area < 2 else 'large'] if land_area else {}
+    for c in CATEGORIES:
+        w[_COL[f'cat:{c}']] = WEIGHTS['water'] * water.get(c, 0.7) + WEIGHTS['land'] * land.get(c, 0.7)
+    w[_COL['demand']] = WEIGHTS['demand']
+    w[_COL['margin']] = WEIGHTS['margin']
+    return w
+
+def recommend(profile, limit=6, season=None):
+    """Best ``limit`` active crops for a farmer profile (a users row) as [(crop_id, score, reasons)]."""
+    if np is None:
+        return []
+    ids, features = crop_features()
+    if not len(ids):
+        return []
+    season = season or current_season()
+    scores = features @ _weights(profile, season)
+    top = np.argpartition(-scores, min(limit, len(ids)) - 1)[:limit]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    soil = FARMER_SOIL.get((profile.get('soil_type') or '').strip())
+    result = []
+    for i in top:
+        f = features[i]
+        reasons = []
+        if f[_COL[f'season:{season}']]:
+            reasons.append(f'{season} season')
+        elif f[_COL['season:All']]:
+            reasons.append('Any season')
+        if soil and f[_COL[f'soil:{soil}']]:
+            reasons.append(f'Suits {soil} soil')
+        if f[_COL['demand']] >= 1.0:
+            reasons.append('High demand')
+        if f[_COL['margin']] > 0.55:
+            reasons.append('Price above average')
+        result.append((int(ids[i]), round(float(scores[i]) * 100), reasons))
+    return result
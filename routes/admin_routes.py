@@ -1,6 +1,12 @@
-# Admin panel: login/signup pages (GET), dashboard
-from flask import Blueprint, render_template, redirect, url_for
+# Admin panel: login/signup pages (GET), dashboard, report exports
+import json
+from flask import Blueprint, render_template, redirect, url_for, request, flash, abort, send_from_directory
+from config import Config
+from db import mysql, read_only
 from auth_utils import admin_required
+import exporters
+from product_import import CATEGORIES
+import sales
 
 admin_bp = Blueprint('admin_routes', __name__)
 
@@ -14,5 +20,48 @@ def admin_signup_page():
 
 @admin_bp.route('/dashboard')
 @admin_required
+@read_only
 def admin_dashboard():
-    return render_template('admin/dashboard.html')
+    cur = mysql.connection.cursor()
+    stats = sales.dashboard(cur)
+    cur.close()
+    return render_template('admin/dashboard.html', stats=stats)
+
+ADMIN_REPORTS = ('orders', 'products')
+
+@admin_bp.route('/exports', methods=['GET', 'POST'])
+@admin_required
+def admin_exports():
+    """Queue an orders or products export as a background job, and list recent ones. The job
+    writes the file to EXPORT_FOLDER, so a large export never holds a web worker."""
+    cur = mysql.connection.cursor()
+    if request.method == 'POST':
+        report, fmt = request.form.get('report'), request.form.get('format')
+        if report not in ADMIN_REPORTS or fmt not in exporters.FORMATS:
+            cur.close()
+            flash('Choose a report and a format.', 'danger')
+            return redirect(url_for('admin_routes.admin_exports'))
+        filters = {k: request.form.get(k, '').strip() for k in ('from', 'to', 'category')}
+        exporters.enqueue_export(cur, report, fmt, {k: v for k, v in filters.items() if v},
+                                 gzip=request.form.get('gzip') in ('1', 'true', 'on'))
+        mysql.connection.commit()
+        cur.close()
+        flash('Export queued. It appears below when ready.', 'success')
+        return redirect(url_for('admin_routes.admin_exports'))
+    cur.execute("""SELECT id, payload, status, error, created_at, finished_at FROM jobs
+                   WHERE kind = 'export' ORDER BY id DESC LIMIT 20""")
+    exports = []
+    for job in cur.fetchall():
+        payload = json.loads(job['payload'] or '{}')
+        exports.append(dict(job, payload=payload, state=exporters.export_state(payload.get('file', ''))))
+    cur.close()
+    return render_template('admin/exports.html', exports=exports, reports=exporters.REPORTS,
+                           admin_reports=ADMIN_REPORTS, categories=CATEGORIES,
+                           retention_hours=Config.EXPORT_RETENTION_HOURS)
+
+@admin_bp.route('/exports/<name>')
+@admin_required
+def admin_export_download(name):
+    if not exporters.export_path(name).is_file():
+        abort(404)
+    return send_from_directory(Config.EXPORT_FOLDER, name, as_attachment=True)
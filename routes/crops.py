@@ -1,58 +1,142 @@
 # Crops: farmer view + admin CRUD (API-style for admin, pages for farmer)
+import base64
 import json
 import os
 from pathlib import Path
-from flask import Blueprint, request, redirect, url_for, render_template, flash, session
-from db import mysql
+from flask import Blueprint, request, redirect, url_for, render_template, flash, session, jsonify
+from db import mysql, read_only
+from catalog_cache import catalog
 from config import Config
 from auth_utils import farmer_required, admin_required
 from validators import validate_crop_name, validate_positive_number
+from images import load_variants, enqueue_variants, refresh_crop_cover
+from uploads import save_upload, release_uploads
 
 crops_bp = Blueprint('crops', __name__)
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
-def _first_image(image_paths):
-    if not image_paths:
-        return None
+# Columns needed to draw a crop card (no TEXT description/inputs)
+CARD_COLUMNS = 'id, name, category, season, soil_type, market_price, india_demand, cover_image, cover_variants, images_processing'
+
+# Soil filter value -> text matched anywhere in soil_type (case-insensitively), as the old client-side filter did
+SOIL_FILTERS = {
+    'well_drained': 'well-drained',
+    'loamy': 'loamy',
+    'sandy_loam': 'sandy loam',
+    'black_soil': 'black soil',
+}
+
+def _encode_cursor(name, crop_id):
+    raw = json.dumps([name, crop_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def _decode_cursor(token):
     try:
-        arr = json.loads(image_paths) if isinstance(image_paths, str) else image_paths
-        return arr[0] if arr else None
+        name, crop_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return str(name), int(crop_id)
     except Exception:
-        return image_paths if isinstance(image_paths, str) else None
+        return None
+
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _search_crops(q='', season='', soil='', category='', after=None, limit=None):
+    """One page of active crops ordered by (name, id), plus the cursor for the next page."""
+    limit = limit or Config.CROPS_PAGE_SIZE
+    where = ['active = 1']
+    params = []
+    if category:
+        where.append('category = %s')
+        params.append(category)
+    if season:
+        where.append('season = %s')
+        params.append(season)
+    if soil:
+        where.append('soil_type LIKE %s')
+        params.append('%' + _like_escape(SOIL_FILTERS.get(soil, soil)) + '%')
+    if q:
+        where.append('name LIKE %s')
+        params.append('%' + _like_escape(q) + '%')
+    if after:
+        where.append('(name > %s OR (name = %s AND id > %s))')
+        params.extend([after[0], after[0], after[1]])
+    cur = mysql.connection.cursor()
+    cur.execute(f'SELECT {CARD_COLUMNS} FROM crops WHERE {" AND ".join(where)} ORDER BY name, id LIMIT %s',
+                (*params, limit + 1))
+    crops = list(cur.fetchall())
+    cur.close()
+    next_cursor = None
+    if len(crops) > limit:
+        crops = crops[:limit]
+        next_cursor = _encode_cursor(crops[-1]['name'], crops[-1]['id'])
+    for c in crops:
+        c['cover_variants'] = load_variants(c['cover_variants'])
+    return crops, next_cursor
+
+def _search_args():
+    return dict(
+        q=request.args.get('q', '').strip()[:150],
+        season=request.args.get('season', '').strip(),
+        soil=request.args.get('soil', '').strip(),
+        category=request.args.get('category', '').strip(),
+    )
+
+def _cached_search(filters, after=None):
+    key = (filters['q'].lower(), filters['season'], filters['soil'], filters['category'], after)
+    return catalog.get_or_load('crops.list', key, lambda: _search_crops(after=after, **filters))
+
+def _invalidate_crop(crop_id=None):
+    catalog.invalidate('crops.list')
+    catalog.invalidate('crops.features')  # recommend.py scoring matrix
+    if crop_id is not None:
+        catalog.invalidate('crops.detail', crop_id)
 
 # ---------- Farmer: list crops ----------
 @crops_bp.route('/')
 @farmer_required
+@read_only
 def list_crops():
-    cur = mysql.connection.cursor()
-    cur.execute('SELECT * FROM crops WHERE active = 1 ORDER BY name')
-    crops = cur.fetchall()
-    for c in crops:
-        c['first_image'] = _first_image(c.get('image_paths'))
-    cur.close()
-    return render_template('farmer/crops_list.html', crops=crops)
+    filters = _search_args()
+    crops, next_cursor = _cached_search(filters)
+    return render_template('farmer/crops_list.html', crops=crops, next_cursor=next_cursor, filters=filters)
+
+# ---------- Farmer: search crops (JSON, one page of rendered cards) ----------
+@crops_bp.route('/search')
+@farmer_required
+@read_only
+def search():
+    after = _decode_cursor(request.args['after']) if request.args.get('after') else None
+    crops, next_cursor = _cached_search(_search_args(), after)
+    return jsonify(html=render_template('components/crop_cards.html', crops=crops), next=next_cursor, count=len(crops))
 
 # ---------- Farmer: crop detail ----------
 @crops_bp.route('/<int:crop_id>')
 @farmer_required
+@read_only
 def crop_detail(crop_id):
+    crop, images, variants = catalog.get_or_load('crops.detail', crop_id, lambda: _load_crop_detail(crop_id))
+    if not crop:
+        flash('Crop not found.', 'danger')
+        return redirect(url_for('crops.list_crops'))
+    return render_template('farmer/crop_detail.html', crop=crop, images=images, variants=variants)
+
+def _crop_images(cur, crop_id):
+    cur.execute('SELECT path, variants FROM crop_images WHERE crop_id = %s ORDER BY position', (crop_id,))
+    return cur.fetchall()
+
+def _load_crop_detail(crop_id):
+    """(crop, image paths in order, {path: variants} for images that have them)."""
     cur = mysql.connection.cursor()
     cur.execute('SELECT * FROM crops WHERE id = %s AND active = 1', (crop_id,))
     crop = cur.fetchone()
-    cur.close()
     if not crop:
-        flash('Crop not found.', 'danger')
-        return redirect(url_for('crops.list_crops'))
-    # Parse image_paths JSON
-    images = []
-    if crop.get('image_paths'):
-        try:
-            images = json.loads(crop['image_paths']) if isinstance(crop['image_paths'], str) else crop['image_paths']
-        except Exception:
-            images = [crop['image_paths']] if crop['image_paths'] else []
-    return render_template('farmer/crop_detail.html', crop=crop, images=images)
+        cur.close()
+        return None, [], {}
+    rows = _crop_images(cur, crop_id)
+    cur.close()
+    return crop, [r['path'] for r in rows], {r['path']: load_variants(r['variants']) for r in rows if r['variants']}
 
 # ---------- Admin: list all crops ----------
 @crops_bp.route('/admin')
@@ -62,10 +146,29 @@ def admin_list():
     cur.execute('SELECT * FROM crops ORDER BY name')
     crops = cur.fetchall()
     for c in crops:
-        c['first_image'] = _first_image(c.get('image_paths'))
+        c['cover_variants'] = load_variants(c['cover_variants'])
     cur.close()
     return render_template('admin/crops_list.html', crops=crops)
 
+def _save_images(cur, crop_id, files, existing):
+    """Store uploaded crop images after ``existing`` ones and queue their variants; returns the new
+    paths (an image the crop already has is skipped). Updates the crop's cover image."""
+    new_paths = []
+    for f in files:
+        if f and f.filename and allowed_file(f.filename):
+            path = save_upload(cur, f)
+            if path in existing or path in new_paths:
+                release_uploads(cur, [path])
+            else:
+                new_paths.append(path)
+    if new_paths:
+        cur.executemany('INSERT INTO crop_images (crop_id, position, path) VALUES (%s, %s, %s)',
+                        [(crop_id, len(existing) + i, p) for i, p in enumerate(new_paths)])
+        cur.execute('UPDATE crops SET images_processing = images_processing + %s WHERE id = %s', (len(new_paths), crop_id))
+        refresh_crop_cover(cur, crop_id)
+        enqueue_variants(cur, 'crops', crop_id, new_paths)
+    return new_paths
+
 # ---------- Admin: add crop ----------
 @crops_bp.route('/admin/add', methods=['GET', 'POST'])
 @admin_required
@@ -98,20 +201,14 @@ def admin_add():
         if not ok:
             flash(err, 'danger')
             return redirect(url_for('crops.admin_add'))
-    image_paths = []
-    files = request.files.getlist('crop_images')
-    for f in files:
-        if f and f.filename and allowed_file(f.filename):
-            fn = f"{len(image_paths)}_{f.filename}"
-            path = Config.CROP_IMAGES_FOLDER / fn
-            f.save(str(path))
-            image_paths.append(f'uploads/crops/{fn}')
     cur = mysql.connection.cursor()
-    cur.execute('''INSERT INTO crops (name, category, image_paths, duration, average_price, market_price, pesticides_name, best_seeds_name, fertilizer_name, season, soil_type, india_demand, description, active)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 1)''',
-                (name, category, json.dumps(image_paths) if image_paths else None, duration or None, avg_price, market_price, pesticides or None, seeds or None, fertilizer or None, season, soil_type or None, demand, description or None))
+    cur.execute('''INSERT INTO crops (name, category, duration, average_price, market_price, pesticides_name, best_seeds_name, fertilizer_name, season, soil_type, india_demand, description, active)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 1)''',
+                (name, category, duration or None, avg_price, market_price, pesticides or None, seeds or None, fertilizer or None, season, soil_type or None, demand, description or None))
+    _save_images(cur, cur.lastrowid, request.files.getlist('crop_images'), [])
     mysql.connection.commit()
     cur.close()
+    _invalidate_crop()
     flash('Crop added successfully.', 'success')
     return redirect(url_for('crops.admin_list'))
 
@@ -127,13 +224,8 @@ def admin_edit(crop_id):
         flash('Crop not found.', 'danger')
         return redirect(url_for('crops.admin_list'))
     if request.method == 'GET':
+        images = [r['path'] for r in _crop_images(cur, crop_id)]
         cur.close()
-        images = []
-        if crop.get('image_paths'):
-            try:
-                images = json.loads(crop['image_paths']) if isinstance(crop['image_paths'], str) else crop['image_paths']
-            except Exception:
-                images = [crop['image_paths']] if crop['image_paths'] else []
         return render_template('admin/crop_form.html', crop=crop, images=images)
     name = request.form.get('name', '').strip()
     category = request.form.get('category', 'Vegetables')
@@ -161,24 +253,15 @@ def admin_edit(crop_id):
         if not ok:
             flash(err, 'danger')
             return redirect(url_for('crops.admin_edit', crop_id=crop_id))
-    image_paths = []
-    if crop.get('image_paths'):
-        try:
-            image_paths = json.loads(crop['image_paths']) if isinstance(crop['image_paths'], str) else crop['image_paths'] or []
-        except Exception:
-            image_paths = [crop['image_paths']] if crop['image_paths'] else []
-    files = request.files.getlist('crop_images')
-    for f in files:
-        if f and f.filename and allowed_file(f.filename):
-            fn = f"{len(image_paths)}_{f.filename}"
-            path = Config.CROP_IMAGES_FOLDER / fn
-            f.save(str(path))
-            image_paths.append(f'uploads/crops/{fn}')
-    cur.execute('''UPDATE crops SET name=%s, category=%s, image_paths=%s, duration=%s, average_price=%s, market_price=%s, pesticides_name=%s, best_seeds_name=%s, fertilizer_name=%s, season=%s, soil_type=%s, india_demand=%s, description=%s
+    cur.execute('''UPDATE crops SET name=%s, category=%s, duration=%s, average_price=%s, market_price=%s, pesticides_name=%s, best_seeds_name=%s, fertilizer_name=%s, season=%s, soil_type=%s, india_demand=%s, description=%s
                    WHERE id=%s''',
-                (name, category, json.dumps(image_paths) if image_paths else None, duration or None, avg_price, market_price, pesticides or None, seeds or None, fertilizer or None, season, soil_type or None, demand, description or None, crop_id))
+                (name, category, duration or None, avg_price, market_price, pesticides or None, seeds or None, fertilizer or None, season, soil_type or None, demand, description or None, crop_id))
+    cur.execute('SELECT path FROM crop_images WHERE crop_id = %s ORDER BY position FOR UPDATE', (crop_id,))
+    existing = [r['path'] for r in cur.fetchall()]
+    _save_images(cur, crop_id, request.files.getlist('crop_images'), existing)
     mysql.connection.commit()
     cur.close()
+    _invalidate_crop(crop_id)
     flash('Crop updated.', 'success')
     return redirect(url_for('crops.admin_list'))
 
@@ -187,9 +270,13 @@ def admin_edit(crop_id):
 @admin_required
 def admin_delete(crop_id):
     cur = mysql.connection.cursor()
-    cur.execute('DELETE FROM crops WHERE id = %s', (crop_id,))
+    cur.execute('SELECT path FROM crop_images WHERE crop_id = %s FOR UPDATE', (crop_id,))
+    paths = [r['path'] for r in cur.fetchall()]
+    cur.execute('DELETE FROM crops WHERE id = %s', (crop_id,))  # crop_images rows go with it (ON DELETE CASCADE)
+    release_uploads(cur, paths)
     mysql.connection.commit()
     cur.close()
+    _invalidate_crop(crop_id)
     flash('Crop deleted.', 'success')
     return redirect(url_for('crops.admin_list'))
 
@@ -201,5 +288,6 @@ def admin_toggle(crop_id):
     cur.execute('UPDATE crops SET active = NOT active WHERE id = %s', (crop_id,))
     mysql.connection.commit()
     cur.close()
+    _invalidate_crop(crop_id)
     flash('Crop status updated.', 'success')
     return redirect(url_for('crops.admin_list'))
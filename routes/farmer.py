@@ -1,6 +1,9 @@
 # Farmer panel: login/signup pages (GET), dashboard
-from flask import Blueprint, render_template, redirect, url_for
+from flask import Blueprint, render_template, redirect, url_for, session
+from db import mysql, read_only
 from auth_utils import farmer_required
+from images import load_variants
+from recommend import recommend
 
 farmer_bp = Blueprint('farmer', __name__)
 
@@ -14,5 +17,21 @@ def signup_page():
 
 @farmer_bp.route('/dashboard')
 @farmer_required
+@read_only
 def dashboard():
-    return render_template('farmer/dashboard.html')
+    cur = mysql.connection.cursor()
+    cur.execute('SELECT soil_type, water_availability, land_area, district FROM users WHERE id = %s', (session['user_id'],))
+    profile = cur.fetchone() or {}
+    picks = recommend(profile)
+    crops = []
+    if picks:
+        cur.execute('''SELECT id, name, category, season, soil_type, market_price, india_demand, cover_image, cover_variants, images_processing
+                       FROM crops WHERE id IN %s''', ([crop_id for crop_id, _, _ in picks],))
+        by_id = {c['id']: c for c in cur.fetchall()}
+        for crop_id, score, reasons in picks:
+            c = by_id.get(crop_id)
+            if c:
+                c.update(score=score, reasons=reasons, cover_variants=load_variants(c['cover_variants']))
+                crops.append(c)
+    cur.close()
+    return render_template('farmer/dashboard.html', recommended=crops, profile=profile)
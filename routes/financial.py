@@ -1,41 +1,127 @@
 # Farmer Financial Analysis: expense, income, profit/loss
-import csv
-import io
+import base64
+import json
+import uuid
+import pymysql
+from datetime import datetime
 from decimal import Decimal
-from flask import Blueprint, request, redirect, url_for, render_template, flash, session, Response
-from db import mysql
+from flask import Blueprint, abort, request, redirect, url_for, render_template, flash, session, Response, stream_with_context, jsonify
+from config import Config
+from db import mysql, read_only
+from catalog_cache import analytics as analytics_cache
+import benchmarks
+import exporters
 from auth_utils import farmer_required
-from validators import validate_crop_name, validate_positive_number
+from validators import validate_crop_name, validate_positive_number, validate_required_string
+from financial_import import import_records, COLUMNS as IMPORT_COLUMNS
+from spreadsheet import SpreadsheetError, extensions as spreadsheet_extensions
 
 financial_bp = Blueprint('financial', __name__)
 
-def _compute_totals(records):
-    for r in records:
-        r['total_expense'] = (Decimal(str(r['seeds_cost'] or 0)) + Decimal(str(r['fertilizer_cost'] or 0)) +
-                              Decimal(str(r['pesticides_cost'] or 0)) + Decimal(str(r['irrigation_cost'] or 0)) +
-                              Decimal(str(r['labour_cost'] or 0)) + Decimal(str(r['machinery_cost'] or 0)) +
-                              Decimal(str(r['other_expenses'] or 0)))
-        prod = Decimal(str(r['total_production'] or 0))
-        price = Decimal(str(r['selling_price'] or 0))
-        r['total_income'] = prod * price
-        r['net_profit'] = r['total_income'] - r['total_expense']
-        if r['net_profit'] > 0:
-            r['status'] = 'Profit'
-        elif r['net_profit'] < 0:
-            r['status'] = 'Loss'
-        else:
-            r['status'] = 'No Profit No Loss'
-    return records
+# Dashboard orders: name -> (column, descending), ties broken by id in the same direction so a
+# page can continue from the last (value, id) shown. Each is a range read of an index that starts
+# with farmer_id: idx_financial_farmer_created (migration 016) or idx_financial_farmer_profit.
+# total_expense, total_income, net_profit and status are stored generated columns (migration 013)
+SORTS = {
+    'newest': ('created_at', True),
+    'profit': ('net_profit', True),
+    'loss': ('net_profit', False),
+}
+TOTALS = ('total_expense', 'total_income', 'net_profit')
+
+COST_COLUMNS = ('seeds_cost', 'fertilizer_cost', 'pesticides_cost', 'irrigation_cost', 'labour_cost',
+                'machinery_cost', 'other_expenses')
+
+# Analytics groupings: name -> SQL expression for the group label
+GROUPS = {
+    'crop': 'crop_name',
+    'season': "COALESCE(NULLIF(TRIM(season), ''), 'Unspecified')",
+    'year': 'YEAR(created_at)',
+}
+
+def _invalidate_analytics(farmer_id):
+    analytics_cache.invalidate('financial', farmer_id)
+
+def _load_analytics(farmer_id):
+    """Totals and cost breakdown per crop, season and year, summed by MySQL (GROUP BY on the
+    generated columns) so only a few rows per group come back whatever the record count."""
+    sums = ', '.join(f'COALESCE(SUM({c}), 0) AS {c}' for c in COST_COLUMNS + ('total_expense', 'total_income', 'net_profit'))
+    cur = mysql.connection.cursor()
+    result = {}
+    for name, expr in GROUPS.items():
+        cur.execute(f'''SELECT {expr} AS label, COUNT(*) AS records, {sums}
+                        FROM financial_records WHERE farmer_id = %s GROUP BY label ORDER BY label''', (farmer_id,))
+        result[name] = [{k: (v if k in ('label', 'records') else float(v)) for k, v in r.items()} for r in cur.fetchall()]
+    cur.close()
+    # Overall figures follow from any one grouping
+    result['totals'] = {k: sum(g[k] for g in result['year'])
+                        for k in ('records',) + COST_COLUMNS + ('total_expense', 'total_income', 'net_profit')}
+    return result
+
+def _encode_cursor(value, record_id):
+    value = value.isoformat() if isinstance(value, datetime) else str(value)
+    return base64.urlsafe_b64encode(json.dumps([value, record_id]).encode('utf-8')).decode('ascii')
+
+def _decode_cursor(token, column):
+    try:
+        value, record_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return (datetime.fromisoformat(value) if column == 'created_at' else Decimal(value)), int(record_id)
+    except Exception:
+        return None
+
+def _sums(source):
+    """SQL for the record count and the sums of TOTALS over ``source`` (a table expression)."""
+    sums = ', '.join(f'COALESCE(SUM({c}), 0) AS {c}' for c in TOTALS)
+    return f'SELECT COUNT(*) AS records, {sums} FROM {source}'
 
 @financial_bp.route('/')
 @farmer_required
+@read_only
 def dashboard():
+    """One page of the farmer's records, optionally for one crop and/or season. A page continues
+    from the last (created_at or net_profit, id) shown, so it is a short index range read however
+    long the history is; page and grand totals are summed by MySQL, not from the rendered rows."""
+    sort = request.args.get('sort', 'newest')
+    sort = sort if sort in SORTS else 'newest'
+    column, descending = SORTS[sort]
+    direction, op = ('DESC', '<') if descending else ('ASC', '>')
+    limit = Config.FINANCIAL_PAGE_SIZE
+    where, params = _record_filters()
+    page_where, page_params = [where], list(params)
+    after = _decode_cursor(request.args['after'], column) if request.args.get('after') else None
+    if after:
+        page_where.append(f'({column} {op} %s OR ({column} = %s AND id {op} %s))')
+        page_params.extend([after[0], after[0], after[1]])
+    page_sql = (f'SELECT * FROM financial_records WHERE {" AND ".join(page_where)} '
+                f'ORDER BY {column} {direction}, id {direction} LIMIT %s')
     cur = mysql.connection.cursor()
-    cur.execute('SELECT * FROM financial_records WHERE farmer_id = %s ORDER BY created_at DESC', (session['user_id'],))
-    records = cur.fetchall()
+    cur.execute(page_sql, (*page_params, limit + 1))
+    records = list(cur.fetchall())
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        next_cursor = _encode_cursor(records[-1][column], records[-1]['id'])
+    page_totals = None
+    if records:
+        cur.execute(_sums(f'({page_sql}) page'), (*page_params, limit))
+        page_totals = cur.fetchone()
+    cur.execute(_sums(f'financial_records WHERE {where}'), params)
+    totals = cur.fetchone()
+    cur.execute('SELECT district, land_area FROM users WHERE id = %s', (session['user_id'],))
+    farmer = cur.fetchone()
+    compare = benchmarks.compare(cur, farmer, records)  # this page's records only
     cur.close()
-    _compute_totals(records)
-    return render_template('farmer/financial_dashboard.html', records=records)
+    filters = {k: request.args.get(k, '').strip() for k in ('crop', 'season')}
+    return render_template('farmer/financial_dashboard.html', records=records, sort=sort, compare=compare,
+                           district=(farmer or {}).get('district'), filters={k: v for k, v in filters.items() if v},
+                           next_cursor=next_cursor, first_page=not after, page_totals=page_totals, totals=totals)
+
+@financial_bp.route('/analytics.json')
+@farmer_required
+@read_only
+def analytics():
+    farmer_id = session['user_id']
+    return jsonify(analytics_cache.get_or_load('financial', farmer_id, lambda: _load_analytics(farmer_id)))
 
 @financial_bp.route('/add', methods=['GET', 'POST'])
 @farmer_required
@@ -72,9 +158,49 @@ def add_record():
                 (session['user_id'], crop_name, season or None, seeds, fertilizer, pesticides, irrigation, labour, machinery, other, production, selling_price))
     mysql.connection.commit()
     cur.close()
+    _invalidate_analytics(session['user_id'])
     flash('Record added. View in dashboard.', 'success')
     return redirect(url_for('financial.dashboard'))
 
+@financial_bp.route('/import', methods=['GET', 'POST'])
+@farmer_required
+def import_csv():
+    if request.method == 'GET':
+        # A fresh key per form: submitting the same form again (retry, double click) re-uses it
+        return render_template('farmer/financial_import.html', report=None, batch_key=uuid.uuid4().hex,
+                               columns=IMPORT_COLUMNS, extensions=spreadsheet_extensions())
+    batch_key = request.form.get('batch_key', '').strip()
+    ok, err = validate_required_string(batch_key, 'Batch key', max_len=64)
+    if not ok:
+        flash(err, 'danger')
+        return redirect(url_for('financial.import_csv'))
+    f = request.files.get('file')
+    if not f or not f.filename:
+        flash('Choose a CSV or XLSX file to import.', 'danger')
+        return redirect(url_for('financial.import_csv'))
+    report = None
+    try:
+        report = import_records(mysql.connection, session['user_id'], batch_key, f)
+    except SpreadsheetError as e:
+        flash(str(e), 'danger')
+    except pymysql.MySQLError as e:
+        flash(f'The import could not be saved ({e}). Upload again with the same batch key to continue.', 'danger')
+    _invalidate_analytics(session['user_id'])
+    if report is None:
+        return redirect(url_for('financial.import_csv'))
+    if report['already_done']:
+        flash(f'This batch was already imported ({report["imported"]} record(s)); nothing was added.', 'info')
+    else:
+        flash(f'{report["imported"]} record(s) imported, {report["failed"]} row(s) rejected.',
+              'success' if not report['failed'] else 'warning')
+    if report['chunks_failed']:
+        # Keep the key: uploading the same file again retries just the chunks that failed
+        flash('Some rows could not be saved. Upload the same file again with this batch key to retry them.', 'warning')
+    else:
+        batch_key = uuid.uuid4().hex
+    return render_template('farmer/financial_import.html', report=report, batch_key=batch_key,
+                           columns=IMPORT_COLUMNS, extensions=spreadsheet_extensions())
+
 @financial_bp.route('/edit/<int:record_id>', methods=['GET', 'POST'])
 @farmer_required
 def edit_record(record_id):
@@ -117,6 +243,7 @@ def edit_record(record_id):
                 (crop_name, season or None, seeds, fertilizer, pesticides, irrigation, labour, machinery, other, production, selling_price, record_id, session['user_id']))
     mysql.connection.commit()
     cur.close()
+    _invalidate_analytics(session['user_id'])
     flash('Record updated.', 'success')
     return redirect(url_for('financial.dashboard'))
 
@@ -127,46 +254,29 @@ def delete_record(record_id):
     cur.execute('DELETE FROM financial_records WHERE id = %s AND farmer_id = %s', (record_id, session['user_id']))
     mysql.connection.commit()
     cur.close()
+    _invalidate_analytics(session['user_id'])
     flash('Record deleted.', 'success')
     return redirect(url_for('financial.dashboard'))
 
-@financial_bp.route('/download/csv')
+def _export_filters():
+    """The request's filters (``crop``, ``season`` prefix, ``from``/``to`` dates, inclusive),
+    always limited to the signed-in farmer's records."""
+    return dict(request.args.items(), farmer_id=session['user_id'])
+
+def _record_filters():
+    """WHERE clause and params for the dashboard, the same filters an export applies."""
+    return exporters.where('financial', _export_filters())
+
+@financial_bp.route('/download/<fmt>')
 @farmer_required
-def download_csv():
-    cur = mysql.connection.cursor()
-    cur.execute('SELECT * FROM financial_records WHERE farmer_id = %s ORDER BY created_at DESC', (session['user_id'],))
-    records = cur.fetchall()
-    cur.close()
-    records = _compute_totals(records)
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow([
-        'Crop Name', 'Season', 'Seeds Cost', 'Fertilizer Cost', 'Pesticides Cost', 'Irrigation Cost',
-        'Labour Cost', 'Machinery Cost', 'Other Expenses', 'Total Expense', 'Total Production', 'Selling Price',
-        'Total Income', 'Net Profit', 'Status', 'Created At'
-    ])
-    for r in records:
-        writer.writerow([
-            r.get('crop_name', ''),
-            r.get('season', ''),
-            r.get('seeds_cost', 0),
-            r.get('fertilizer_cost', 0),
-            r.get('pesticides_cost', 0),
-            r.get('irrigation_cost', 0),
-            r.get('labour_cost', 0),
-            r.get('machinery_cost', 0),
-            r.get('other_expenses', 0),
-            float(r['total_expense']),
-            r.get('total_production', 0),
-            r.get('selling_price', 0),
-            float(r['total_income']),
-            float(r['net_profit']),
-            r.get('status', ''),
-            str(r.get('created_at', ''))
-        ])
-    output.seek(0)
-    return Response(
-        output.getvalue(),
-        mimetype='text/csv',
-        headers={'Content-Disposition': 'attachment; filename=financial_records.csv'}
-    )
+@read_only
+def download(fmt):
+    """The farmer's records as CSV, JSON Lines or XLSX (``fmt``), streamed as they are read;
+    ``gzip=1`` compresses CSV and JSON Lines."""
+    if fmt not in exporters.FORMATS:
+        abort(404)
+    gzip = request.args.get('gzip') in ('1', 'true', 'on')
+    body = exporters.stream(mysql.connection, 'financial', _export_filters(), fmt, gzip=gzip)
+    # stream_with_context keeps the request (and its DB connection) alive while the rows are sent
+    return Response(stream_with_context(body), mimetype=exporters.mimetype(fmt, gzip),
+                    headers={'Content-Disposition': f'attachment; filename={exporters.filename("financial_records", fmt, gzip)}'})
@@ -1,6 +1,7 @@
 # Government Schemes: admin CRUD, farmer view
 from flask import Blueprint, request, redirect, url_for, render_template, flash
-from db import mysql
+from db import mysql, read_only
+from catalog_cache import catalog
 from auth_utils import farmer_required, admin_required
 from validators import validate_required_string
 
@@ -9,12 +10,17 @@ schemes_bp = Blueprint('schemes', __name__)
 # ---------- Farmer: list schemes ----------
 @schemes_bp.route('/')
 @farmer_required
+@read_only
 def list_schemes():
+    schemes = catalog.get_or_load('schemes.list', 'active', _load_active_schemes)
+    return render_template('farmer/schemes_list.html', schemes=schemes)
+
+def _load_active_schemes():
     cur = mysql.connection.cursor()
     cur.execute('SELECT * FROM schemes WHERE status = %s ORDER BY name', ('Active',))
     schemes = cur.fetchall()
     cur.close()
-    return render_template('farmer/schemes_list.html', schemes=schemes)
+    return schemes
 
 # ---------- Admin: list all ----------
 @schemes_bp.route('/admin')
@@ -50,6 +56,7 @@ def admin_add():
                 (name, scheme_type, eligible_crop or None, eligibility or None, benefits or None, documents or None, apply_link or None, status))
     mysql.connection.commit()
     cur.close()
+    catalog.invalidate('schemes.list')
     flash('Scheme added.', 'success')
     return redirect(url_for('schemes.admin_list'))
 
@@ -83,6 +90,7 @@ def admin_edit(scheme_id):
                 (name, scheme_type, eligible_crop or None, eligibility or None, benefits or None, documents or None, apply_link or None, status, scheme_id))
     mysql.connection.commit()
     cur.close()
+    catalog.invalidate('schemes.list')
     flash('Scheme updated.', 'success')
     return redirect(url_for('schemes.admin_list'))
 
@@ -94,5 +102,6 @@ def admin_delete(scheme_id):
     cur.execute('DELETE FROM schemes WHERE id = %s', (scheme_id,))
     mysql.connection.commit()
     cur.close()
+    catalog.invalidate('schemes.list')
     flash('Scheme deleted.', 'success')
     return redirect(url_for('schemes.admin_list'))
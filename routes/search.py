@@ -0,0 +1,113 @@
+# Search: one ranked, paginated search over crops, schemes and products (MySQL FULLTEXT)
+import re
+from flask import Blueprint, request, render_template
+from markupsafe import Markup, escape
+from db import mysql, read_only
+from config import Config
+from auth_utils import farmer_required
+from images import load_variants
+
+search_bp = Blueprint('search', __name__)
+
+KINDS = ('crops', 'schemes', 'products')
+
+# Per kind: table, row filter, searchable columns (must match the FULLTEXT indexes), result columns.
+# Name matches count double: score = 2 * MATCH(name) + MATCH(all columns).
+SOURCES = {
+    'crops': dict(
+        table='crops', where='active = 1 AND ',
+        text='name, description, best_seeds_name, fertilizer_name, pesticides_name',
+        select="id, name AS title, category AS subtitle, cover_image AS image, cover_variants AS variants",
+    ),
+    'schemes': dict(
+        table='schemes', where="status = 'Active' AND ",
+        text='name, eligible_crop, benefits',
+        select="id, name AS title, scheme_type AS subtitle, NULL AS image, NULL AS variants",
+    ),
+    'products': dict(
+        table='products', where='',
+        text='name, brand, usage_crops, nutrient_composition',
+        select="id, name AS title, category AS subtitle, image_path AS image, image_variants AS variants",
+    ),
+}
+
+# A word character; \w alone would split Gujarati/Hindi words at their vowel signs
+_WORD = r'[\w\u0900-\u097F\u0A80-\u0AFF]'
+_TOKEN = re.compile(_WORD + '+')
+# InnoDB's default stopwords of 3+ letters: never indexed, so requiring one would match nothing
+_STOPWORDS = {'about', 'are', 'com', 'for', 'from', 'how', 'that', 'the', 'this', 'und', 'was', 'what',
+              'when', 'where', 'who', 'will', 'with', 'www'}
+
+def _terms(q):
+    """Search words, lower-cased and de-duplicated. Words below InnoDB's default
+    innodb_ft_min_token_size (3) and stopwords are never indexed, so they are dropped."""
+    words = (t.lower() for t in _TOKEN.findall(q))
+    return list(dict.fromkeys(w for w in words if len(w) >= 3 and w not in _STOPWORDS))[:8]
+
+def _boolean_query(terms):
+    # Every word required, each as a prefix ("tom" finds "tomato")
+    return ' '.join(f'+{t}*' for t in terms)
+
+def _search(terms, kinds, page, per_page):
+    """One page of results, best first, plus whether another page exists.
+
+    Each branch is limited to the rows the page can need, so MySQL only sorts
+    (page * per_page + 1) matches per table however large the catalog is.
+    """
+    against = _boolean_query(terms)
+    limit = page * per_page + 1
+    branches, params = [], []
+    for kind in kinds:
+        src = SOURCES[kind]
+        branches.append(f'''(SELECT '{kind}' AS kind, {src["select"]}, CONCAT_WS(' · ', {src["text"]}) AS body,
+                                2 * MATCH(name) AGAINST (%s IN BOOLEAN MODE) + MATCH({src["text"]}) AGAINST (%s IN BOOLEAN MODE) AS score
+                             FROM {src["table"]} WHERE {src["where"]}MATCH({src["text"]}) AGAINST (%s IN BOOLEAN MODE)
+                             ORDER BY score DESC, id LIMIT %s)''')
+        params.extend([against, against, against, limit])
+    cur = mysql.connection.cursor()
+    cur.execute(' UNION ALL '.join(branches) + ' ORDER BY score DESC, kind, id LIMIT %s OFFSET %s',
+                (*params, per_page + 1, (page - 1) * per_page))
+    rows = list(cur.fetchall())
+    cur.close()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    for r in rows:
+        r['snippet'] = snippet(r.pop('body'), terms)
+        r['variants'] = load_variants(r['variants'])
+    return rows, has_next
+
+def snippet(text, terms, width=160):
+    """Escaped excerpt of ``text`` around the first matching word, with matches in <mark>."""
+    text = ' '.join((text or '').split())
+    if not text:
+        return Markup('')
+    pattern = re.compile(f'(?<!{_WORD})(?:' + '|'.join(re.escape(t) for t in terms) + f'){_WORD}*', re.IGNORECASE)
+    first = pattern.search(text)
+    start = max(0, (first.start() if first else 0) - width // 3)
+    if start:
+        start = text.find(' ', start) + 1 or start
+    end = min(len(text), start + width)
+    piece = text[start:end]
+    out, pos = [], 0
+    for m in pattern.finditer(piece):
+        out.append(escape(piece[pos:m.start()]))
+        out.append(Markup('<mark>%s</mark>') % m.group(0))
+        pos = m.end()
+    out.append(escape(piece[pos:]))
+    prefix = '… ' if start else ''
+    suffix = ' …' if end < len(text) else ''
+    return Markup(prefix) + Markup('').join(out) + Markup(suffix)
+
+# ---------- Farmer: search everything ----------
+@search_bp.route('/')
+@farmer_required
+@read_only
+def search():
+    q = request.args.get('q', '').strip()[:150]
+    kind = request.args.get('type', '')
+    kinds = [kind] if kind in KINDS else list(KINDS)
+    page = max(1, min(request.args.get('page', 1, type=int) or 1, 50))
+    terms = _terms(q)
+    results, has_next = _search(terms, kinds, page, Config.SEARCH_PAGE_SIZE) if terms else ([], False)
+    return render_template('farmer/search.html', q=q, kind=kind if kind in KINDS else '', page=page,
+                           results=results, has_next=has_next, too_short=bool(q) and not terms)
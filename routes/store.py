@@ -1,39 +1,124 @@
 # Farm Store: products (admin CRUD), farmer cart & checkout & billing
+import base64
 import json
-from decimal import Decimal
-from flask import Blueprint, request, redirect, url_for, render_template, flash, session
-from db import mysql
+from datetime import datetime
+import pymysql
+from flask import Blueprint, request, redirect, url_for, render_template, flash, session, send_file
+from db import mysql, read_only
+from catalog_cache import catalog
 from config import Config
 from auth_utils import farmer_required, admin_required
 from validators import validate_required_string, validate_positive_number, validate_decimal_range
+from images import load_variants, enqueue_variants
+from uploads import save_upload, release_uploads
+import jobs
+from pricing import price_lines
+from invoices import BUYER_FIELDS, invoice_path, render_after_checkout, render_invoice
+from product_import import import_products, COLUMNS as IMPORT_COLUMNS
+from spreadsheet import SpreadsheetError, extensions as spreadsheet_extensions
+import sales
 
 store_bp = Blueprint('store', __name__)
 
+ORDER_SUMMARY_ITEMS = 3  # product names kept in orders.items_summary
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
+def _invalidate_products(*product_ids):
+    catalog.invalidate('products.list')
+    if product_ids:
+        catalog.invalidate('products.detail', *product_ids)
+
 # ---------- Farmer: product list ----------
 @store_bp.route('/')
 @farmer_required
+@read_only
 def product_list():
+    products = catalog.get_or_load('products.list', 'in_stock', _load_in_stock_products)
+    if Config.CART_RESERVATIONS:
+        # Holds change by the minute, so they are read fresh and never cached with the catalog
+        cur = mysql.connection.cursor()
+        held = _held(cur)
+        cur.close()
+        products = [dict(p, available=p['stock'] - held.get(p['id'], 0)) for p in products]
+    return render_template('farmer/store_list.html', products=products)
+
+def _load_in_stock_products():
     cur = mysql.connection.cursor()
     cur.execute('SELECT * FROM products WHERE stock > 0 ORDER BY name')
     products = cur.fetchall()
     cur.close()
-    return render_template('farmer/store_list.html', products=products)
+    for p in products:
+        p['variants'] = load_variants(p.get('image_variants'))
+    return products
 
 # ---------- Farmer: product detail ----------
 @store_bp.route('/product/<int:product_id>')
 @farmer_required
+@read_only
 def product_detail(product_id):
+    product = catalog.get_or_load('products.detail', product_id, lambda: _load_product(product_id))
+    if not product:
+        flash('Product not found.', 'danger')
+        return redirect(url_for('store.product_list'))
+    if Config.CART_RESERVATIONS:
+        cur = mysql.connection.cursor()
+        product = dict(product, available=product['stock'] - _held(cur, [product_id]).get(product_id, 0))
+        cur.close()
+    return render_template('farmer/store_product_detail.html', product=product)
+
+def _load_product(product_id):
     cur = mysql.connection.cursor()
     cur.execute('SELECT * FROM products WHERE id = %s', (product_id,))
     product = cur.fetchone()
     cur.close()
+    if product:
+        product['variants'] = load_variants(product.get('image_variants'))
+    return product
+
+# ---------- Cart reservations (Config.CART_RESERVATIONS) ----------
+def _held(cur, product_ids=None):
+    """Units under other farmers' unexpired holds, as {product_id: units}. One grouped read of
+    idx_stock_holds_product (product_id, expires_at, quantity, farmer_id), which covers the query
+    (migration 018 added farmer_id, so the ``farmer_id <>`` filter needs no row lookups)."""
+    sql = 'SELECT product_id, SUM(quantity) AS held FROM stock_holds WHERE expires_at > NOW() AND farmer_id <> %s'
+    args = [session['user_id']]
+    if product_ids is not None:
+        sql += ' AND product_id IN %s'
+        args.append(list(product_ids))
+    cur.execute(sql + ' GROUP BY product_id', args)
+    return {r['product_id']: int(r['held']) for r in cur.fetchall()}
+
+def _reserve(cur, product_id, quantity):
+    """Hold ``quantity`` units of a product for this farmer for CART_HOLD_MINUTES, replacing any
+    earlier hold. Run inside a transaction; returns (True, None) or (False, units available)."""
+    # The product row lock serializes holds on one product, so two carts cannot claim the same units
+    cur.execute('SELECT stock FROM products WHERE id = %s FOR UPDATE', (product_id,))
+    product = cur.fetchone()
     if not product:
-        flash('Product not found.', 'danger')
-        return redirect(url_for('store.product_list'))
-    return render_template('farmer/store_product_detail.html', product=product)
+        return False, 0
+    available = product['stock'] - _held(cur, [product_id]).get(product_id, 0)
+    if quantity > available:
+        return False, max(available, 0)
+    cur.execute('''INSERT INTO stock_holds (farmer_id, product_id, quantity, expires_at)
+                   VALUES (%s, %s, %s, NOW() + INTERVAL %s MINUTE)
+                   ON DUPLICATE KEY UPDATE quantity = VALUES(quantity), expires_at = VALUES(expires_at)''',
+                (session['user_id'], product_id, quantity, Config.CART_HOLD_MINUTES))
+    return True, None
+
+@jobs.periodic
+def _sweep_holds(conn):
+    """Delete expired holds in batches (queries already ignore them; this keeps the table small)."""
+    if not Config.CART_RESERVATIONS:
+        return
+    cur = conn.cursor()
+    while True:
+        cur.execute('DELETE FROM stock_holds WHERE expires_at <= NOW() LIMIT 1000')
+        conn.commit()
+        if cur.rowcount < 1000:
+            break
+    cur.close()
 
 # ---------- Farmer: add to cart ----------
 @store_bp.route('/cart/add', methods=['POST'])
@@ -43,12 +128,27 @@ def cart_add():
     quantity = request.form.get('quantity', 1, type=int)
     if not product_id or quantity < 1:
         return redirect(url_for('store.product_list'))
-    cur = mysql.connection.cursor()
+    conn = mysql.connection
+    cur = conn.cursor()
+    if Config.CART_RESERVATIONS:
+        conn.begin()
+        cur.execute('SELECT quantity FROM cart WHERE farmer_id = %s AND product_id = %s FOR UPDATE', (session['user_id'], product_id))
+        row = cur.fetchone()
+        ok, available = _reserve(cur, product_id, (row['quantity'] if row else 0) + quantity)
+        if not ok:
+            conn.rollback()
+            cur.close()
+            flash(f'Only {available} available right now (including any already in your cart).' if available
+                  else 'No stock is available right now.', 'danger')
+            return redirect(request.referrer or url_for('store.product_list'))
     cur.execute('INSERT INTO cart (farmer_id, product_id, quantity) VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE quantity = quantity + %s',
                 (session['user_id'], product_id, quantity, quantity))
-    mysql.connection.commit()
+    conn.commit()
     cur.close()
-    flash('Added to cart.', 'success')
+    if Config.CART_RESERVATIONS:
+        flash(f'Added to cart and reserved for {Config.CART_HOLD_MINUTES} minutes.', 'success')
+    else:
+        flash('Added to cart.', 'success')
     return redirect(request.referrer or url_for('store.product_list'))
 
 # ---------- Farmer: view cart ----------
@@ -56,11 +156,18 @@ def cart_add():
 @farmer_required
 def cart_view():
     cur = mysql.connection.cursor()
-    cur.execute('''SELECT c.id, c.product_id, c.quantity, p.name, p.price, p.discount, p.image_path, p.stock
-                   FROM cart c JOIN products p ON p.id = c.product_id WHERE c.farmer_id = %s''', (session['user_id'],))
+    if Config.CART_RESERVATIONS:
+        cur.execute('''SELECT c.id, c.product_id, c.quantity, p.name, p.price, p.discount, p.category, p.image_path, p.stock,
+                              IF(h.expires_at > NOW(), h.expires_at, NULL) AS held_until
+                       FROM cart c JOIN products p ON p.id = c.product_id
+                       LEFT JOIN stock_holds h ON h.farmer_id = c.farmer_id AND h.product_id = c.product_id
+                       WHERE c.farmer_id = %s''', (session['user_id'],))
+    else:
+        cur.execute('''SELECT c.id, c.product_id, c.quantity, p.name, p.price, p.discount, p.category, p.image_path, p.stock
+                       FROM cart c JOIN products p ON p.id = c.product_id WHERE c.farmer_id = %s''', (session['user_id'],))
     items = cur.fetchall()
     cur.close()
-    return render_template('farmer/cart.html', items=items)
+    return render_template('farmer/cart.html', pricing=price_lines(items))
 
 # ---------- Farmer: update cart quantity ----------
 @store_bp.route('/cart/update', methods=['POST'])
@@ -69,12 +176,26 @@ def cart_update():
     cart_id = request.form.get('cart_id', type=int)
     quantity = request.form.get('quantity', 1, type=int)
     if cart_id and quantity >= 0:
-        cur = mysql.connection.cursor()
+        conn = mysql.connection
+        cur = conn.cursor()
+        if Config.CART_RESERVATIONS:
+            conn.begin()
+            cur.execute('SELECT product_id FROM cart WHERE id = %s AND farmer_id = %s FOR UPDATE', (cart_id, session['user_id']))
+            row = cur.fetchone()
+            if row and quantity == 0:
+                cur.execute('DELETE FROM stock_holds WHERE farmer_id = %s AND product_id = %s', (session['user_id'], row['product_id']))
+            elif row:
+                ok, available = _reserve(cur, row['product_id'], quantity)
+                if not ok:
+                    conn.rollback()
+                    cur.close()
+                    flash(f'Only {available} available right now.' if available else 'No stock is available right now.', 'danger')
+                    return redirect(url_for('store.cart_view'))
         if quantity == 0:
             cur.execute('DELETE FROM cart WHERE id = %s AND farmer_id = %s', (cart_id, session['user_id']))
         else:
             cur.execute('UPDATE cart SET quantity = %s WHERE id = %s AND farmer_id = %s', (quantity, cart_id, session['user_id']))
-        mysql.connection.commit()
+        conn.commit()
         cur.close()
     return redirect(url_for('store.cart_view'))
 
@@ -82,78 +203,153 @@ def cart_update():
 @store_bp.route('/checkout', methods=['GET', 'POST'])
 @farmer_required
 def checkout():
-    cur = mysql.connection.cursor()
-    cur.execute('''SELECT c.id, c.product_id, c.quantity, p.name, p.price, p.discount, p.stock
-                   FROM cart c JOIN products p ON p.id = c.product_id WHERE c.farmer_id = %s''', (session['user_id'],))
-    items = cur.fetchall()
+    conn = mysql.connection
+    cur = conn.cursor()
+    if request.method == 'POST':
+        # One transaction. Locking this farmer's cart rows makes a double-submitted checkout
+        # wait here and then find the cart empty; products are locked by the stock UPDATE below.
+        conn.begin()
+        cur.execute('SELECT id FROM cart WHERE farmer_id = %s FOR UPDATE', (session['user_id'],))
+    items = _cart_items(cur)
     if not items:
+        conn.rollback()
         cur.close()
         flash('Cart is empty.', 'warning')
         return redirect(url_for('store.product_list'))
-    # Check stock
-    for it in items:
-        if it['quantity'] > it['stock']:
-            flash(f'Insufficient stock for {it["name"]}.', 'danger')
-            cur.close()
-            return redirect(url_for('store.cart_view'))
+    short = [it for it in items if it['quantity'] > it['available']]
+    if short:
+        conn.rollback()
+        cur.close()
+        _flash_short(short)
+        return redirect(url_for('store.cart_view'))
+    pricing = price_lines(items)
     if request.method == 'GET':
         cur.execute('SELECT name FROM users WHERE id = %s', (session['user_id'],))
         user = cur.fetchone()
-        # Calculate totals for display
-        subtotal = Decimal('0')
-        for it in items:
-            price = Decimal(str(it['price'])) * (1 - Decimal(str(it['discount'] or 0)) / 100)
-            subtotal += price * it['quantity']
-        gst = subtotal * Decimal('0.05')
-        total = subtotal + gst
         cur.close()
-        return render_template('farmer/checkout.html', items=items, user=user, subtotal=subtotal, gst=gst, total=total)
-    # POST: create order
-    subtotal = Decimal('0')
-    for it in items:
-        price = Decimal(str(it['price'])) * (1 - Decimal(str(it['discount'] or 0)) / 100)
-        subtotal += price * it['quantity']
-    gst = subtotal * Decimal('0.05')  # 5% GST
-    total = subtotal + gst
-    cur.execute('INSERT INTO orders (farmer_id, subtotal, gst, total, status) VALUES (%s, %s, %s, %s, %s)',
-                (session['user_id'], float(subtotal), float(gst), float(total), 'Completed'))
+        return render_template('farmer/checkout.html', pricing=pricing, user=user)
+    # POST: take all stock in one statement, only where enough is left. Rows are locked in id
+    # order, so concurrent checkouts cannot deadlock, and a short row is simply not updated.
+    qty = {it['product_id']: it['quantity'] for it in items}
+    ids = sorted(qty)
+    case = 'CASE id ' + ' '.join(['WHEN %s THEN %s'] * len(ids)) + ' END'
+    case_args = [v for pid in ids for v in (pid, qty[pid])]
+    held, held_args = '', []
+    if Config.CART_RESERVATIONS:
+        # Units under other farmers' unexpired holds are not for sale
+        held = (' - (SELECT COALESCE(SUM(h.quantity), 0) FROM stock_holds h'
+                ' WHERE h.product_id = products.id AND h.farmer_id <> %s AND h.expires_at > NOW())')
+        held_args = [session['user_id']]
+    cur.execute(f'UPDATE products SET stock = stock - {case} WHERE id IN %s AND stock{held} >= {case}',
+                (*case_args, ids, *held_args, *case_args))
+    if cur.rowcount != len(ids):
+        # Someone bought (or reserved) the same product since the cart was read: nothing is sold
+        conn.rollback()
+        _flash_short([it for it in _cart_items(cur) if it['quantity'] > it['available']])
+        cur.close()
+        _invalidate_products(*ids)
+        return redirect(url_for('store.cart_view'))
+    # The buyer's details are copied onto the order so the invoice never follows later profile edits
+    cur.execute(f'SELECT {", ".join(BUYER_FIELDS)} FROM users WHERE id = %s', (session['user_id'],))
+    buyer = cur.fetchone()
+    cur.execute(f'''INSERT INTO orders (farmer_id, {", ".join('buyer_' + f for f in BUYER_FIELDS)},
+                                        subtotal, gst, total, status, item_count, items_summary)
+                    VALUES (%s, {", ".join(['%s'] * len(BUYER_FIELDS))}, %s, %s, %s, %s, %s, %s)''',
+                (session['user_id'], *(buyer[f] for f in BUYER_FIELDS), pricing['subtotal'], pricing['gst'],
+                 pricing['total'], 'Completed', len(pricing['lines']), _items_summary(pricing['lines'])))
     order_id = cur.lastrowid
-    for it in items:
-        price = Decimal(str(it['price'])) * (1 - Decimal(str(it['discount'] or 0)) / 100)
-        cur.execute('INSERT INTO order_items (order_id, product_id, quantity, price_per_unit) VALUES (%s, %s, %s, %s)',
-                    (order_id, it['product_id'], it['quantity'], float(price)))
-        cur.execute('UPDATE products SET stock = stock - %s WHERE id = %s', (it['quantity'], it['product_id']))
+    cur.executemany('''INSERT INTO order_items (order_id, product_id, product_name, quantity, price_per_unit,
+                                                gst_rate, gst_amount)
+                       VALUES (%s, %s, %s, %s, %s, %s, %s)''',
+                    [(order_id, ln['product_id'], ln['name'], ln['quantity'], ln['unit_price'], ln['gst_rate'], ln['gst'])
+                     for ln in pricing['lines']])
     cur.execute('DELETE FROM cart WHERE farmer_id = %s', (session['user_id'],))
-    mysql.connection.commit()
+    if Config.CART_RESERVATIONS:
+        cur.execute('DELETE FROM stock_holds WHERE farmer_id = %s', (session['user_id'],))
+    # Last, so the shared rollup rows stay locked for as short a time as possible
+    sales.record_order(cur, order_id, pricing['lines'])
+    conn.commit()
     cur.close()
+    # Stock changed: product list hides sold-out items, detail shows stock
+    _invalidate_products(*ids)
+    # Written now, from the committed order, so viewing it later is only a file response
+    render_after_checkout(session['user_id'], order_id)
     flash('Order placed successfully.', 'success')
     return redirect(url_for('store.order_history'))
 
+def _items_summary(lines):
+    """Names of an order's largest lines, stored with the order so history needs no join."""
+    top = sorted(lines, key=lambda ln: ln['amount'], reverse=True)[:ORDER_SUMMARY_ITEMS]
+    return ', '.join(ln['name'] for ln in top)[:255]
+
+def _cart_items(cur):
+    """Cart lines with product data; ``available`` is stock minus other farmers' holds."""
+    cur.execute('''SELECT c.id, c.product_id, c.quantity, p.name, p.price, p.discount, p.category, p.stock
+                   FROM cart c JOIN products p ON p.id = c.product_id WHERE c.farmer_id = %s''', (session['user_id'],))
+    items = cur.fetchall()
+    held = _held(cur, [it['product_id'] for it in items]) if Config.CART_RESERVATIONS and items else {}
+    for it in items:
+        it['available'] = it['stock'] - held.get(it['product_id'], 0)
+    return items
+
+def _flash_short(items):
+    for it in items:
+        left = max(it['available'], 0)
+        flash(f'Insufficient stock for {it["name"]}: {left} left, {it["quantity"]} in your cart.' if left
+              else f'{it["name"]} is out of stock.', 'danger')
+
 # ---------- Farmer: order invoice ----------
 @store_bp.route('/order/<int:order_id>')
 @farmer_required
+@read_only
 def order_invoice(order_id):
-    cur = mysql.connection.cursor()
-    cur.execute('SELECT * FROM orders WHERE id = %s AND farmer_id = %s', (order_id, session['user_id']))
-    order = cur.fetchone()
-    if not order:
-        cur.close()
+    # Rendered at checkout (or here on the first view, if that failed); a file response with
+    # ETag/Last-Modified and no DB work. The file lives under the farmer's own folder, so it exists
+    # only for their own orders.
+    path = invoice_path(session['user_id'], order_id)
+    if not path.exists() and not render_invoice(session['user_id'], order_id):
         flash('Order not found.', 'danger')
         return redirect(url_for('store.order_history'))
-    cur.execute('SELECT oi.*, p.name FROM order_items oi JOIN products p ON p.id = oi.product_id WHERE oi.order_id = %s', (order_id,))
-    items = cur.fetchall()
-    cur.close()
-    return render_template('farmer/invoice.html', order=order, items=items)
+    response = send_file(path, mimetype='text/html', conditional=True, etag=True, max_age=0)
+    response.cache_control.private = True
+    return response
 
 # ---------- Farmer: order history ----------
 @store_bp.route('/orders')
 @farmer_required
+@read_only
 def order_history():
+    """Newest orders first, one page at a time. Pages continue from the last (order_date, id)
+    shown, so every page is a short range read of idx_orders_farmer_date however many orders
+    the farmer has; item counts and names come from the order row itself."""
+    limit = Config.ORDERS_PAGE_SIZE
+    where, params = ['farmer_id = %s'], [session['user_id']]
+    before = _decode_order_cursor(request.args['before']) if request.args.get('before') else None
+    if before:
+        where.append('(order_date < %s OR (order_date = %s AND id < %s))')
+        params.extend([before[0], before[0], before[1]])
     cur = mysql.connection.cursor()
-    cur.execute('SELECT * FROM orders WHERE farmer_id = %s ORDER BY order_date DESC', (session['user_id'],))
-    orders = cur.fetchall()
+    cur.execute(f'''SELECT id, order_date, total, status, item_count, items_summary FROM orders
+                    WHERE {" AND ".join(where)} ORDER BY order_date DESC, id DESC LIMIT %s''', (*params, limit + 1))
+    orders = list(cur.fetchall())
     cur.close()
-    return render_template('farmer/order_history.html', orders=orders)
+    next_cursor = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        next_cursor = _encode_order_cursor(orders[-1]['order_date'], orders[-1]['id'])
+    return render_template('farmer/order_history.html', orders=orders, next_cursor=next_cursor,
+                           first_page=not before, summary_items=ORDER_SUMMARY_ITEMS)
+
+def _encode_order_cursor(order_date, order_id):
+    raw = json.dumps([order_date.isoformat(), order_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+def _decode_order_cursor(token):
+    try:
+        order_date, order_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+        return datetime.fromisoformat(order_date), int(order_id)
+    except Exception:
+        return None
 
 # ---------- Admin: product list ----------
 @store_bp.route('/admin')
@@ -163,6 +359,8 @@ def admin_list():
     cur.execute('SELECT * FROM products ORDER BY name')
     products = cur.fetchall()
     cur.close()
+    for p in products:
+        p['variants'] = load_variants(p.get('image_variants'))
     return render_template('admin/products_list.html', products=products)
 
 # ---------- Admin: add product ----------
@@ -196,21 +394,51 @@ def admin_add():
     if not ok:
         flash(err, 'danger')
         return redirect(url_for('store.admin_add'))
+    cur = mysql.connection.cursor()
     image_path = None
     f = request.files.get('product_image')
     if f and f.filename and allowed_file(f.filename):
-        path = Config.PRODUCT_IMAGES_FOLDER / f.filename
-        f.save(str(path))
-        image_path = f'uploads/products/{f.filename}'
-    cur = mysql.connection.cursor()
-    cur.execute('''INSERT INTO products (name, image_path, category, brand, description, price, discount, stock, usage_crops, nutrient_composition)
-                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
-                (name, image_path, category, brand or None, description or None, price, discount, stock, usage_crops or None, nutrient or None))
+        image_path = save_upload(cur, f)
+    cur.execute('''INSERT INTO products (name, image_path, images_processing, category, brand, description, price, discount, stock, usage_crops, nutrient_composition)
+                   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                (name, image_path, 1 if image_path else 0, category, brand or None, description or None, price, discount, stock, usage_crops or None, nutrient or None))
+    if image_path:
+        enqueue_variants(cur, 'products', cur.lastrowid, [image_path])
     mysql.connection.commit()
     cur.close()
+    _invalidate_products()
     flash('Product added.', 'success')
     return redirect(url_for('store.admin_list'))
 
+# ---------- Admin: bulk import products (CSV/XLSX, upsert by SKU) ----------
+@store_bp.route('/admin/import', methods=['GET', 'POST'])
+@admin_required
+def admin_import():
+    if request.method == 'GET':
+        return render_template('admin/product_import.html', report=None, columns=IMPORT_COLUMNS,
+                               extensions=spreadsheet_extensions())
+    f = request.files.get('file')
+    if not f or not f.filename:
+        flash('Choose a CSV or XLSX file to import.', 'danger')
+        return redirect(url_for('store.admin_import'))
+    report = None
+    try:
+        report = import_products(mysql.connection, f)
+    except SpreadsheetError as e:
+        flash(str(e), 'danger')
+    except pymysql.MySQLError as e:
+        flash(f'The import stopped: {e}', 'danger')
+    # Whatever was committed before an error is live, so the list is refreshed either way. Any
+    # product may have changed, so every cached detail page goes too (no keys = whole namespace)
+    _invalidate_products()
+    catalog.invalidate('products.detail')
+    if report is None:
+        return redirect(url_for('store.admin_import'))
+    flash(f'{report["imported"]} product(s) imported, {report["failed"]} row(s) rejected.',
+          'success' if not report['failed'] else 'warning')
+    return render_template('admin/product_import.html', report=report, columns=IMPORT_COLUMNS,
+                           extensions=spreadsheet_extensions())
+
 # ---------- Admin: edit product ----------
 @store_bp.route('/admin/edit/<int:product_id>', methods=['GET', 'POST'])
 @admin_required
@@ -251,15 +479,23 @@ def admin_edit(product_id):
         flash(err, 'danger')
         return redirect(url_for('store.admin_edit', product_id=product_id))
     image_path = product.get('image_path')
+    new_image = False
     f = request.files.get('product_image')
     if f and f.filename and allowed_file(f.filename):
-        path = Config.PRODUCT_IMAGES_FOLDER / f.filename
-        f.save(str(path))
-        image_path = f'uploads/products/{f.filename}'
-    cur.execute('''UPDATE products SET name=%s, image_path=%s, category=%s, brand=%s, description=%s, price=%s, discount=%s, stock=%s, usage_crops=%s, nutrient_composition=%s WHERE id=%s''',
-                (name, image_path, category, brand or None, description or None, price, discount, stock, usage_crops or None, nutrient or None, product_id))
+        image_path = save_upload(cur, f)
+        if image_path == product.get('image_path'):
+            release_uploads(cur, [image_path])  # same picture uploaded again
+        else:
+            release_uploads(cur, [product.get('image_path')])
+            new_image = True
+    # A new image drops the old variants; the placeholder shows until the job attaches new ones
+    cur.execute('''UPDATE products SET name=%s, image_path=%s, image_variants=IF(%s, NULL, image_variants), images_processing=images_processing + %s, category=%s, brand=%s, description=%s, price=%s, discount=%s, stock=%s, usage_crops=%s, nutrient_composition=%s WHERE id=%s''',
+                (name, image_path, new_image, int(new_image), category, brand or None, description or None, price, discount, stock, usage_crops or None, nutrient or None, product_id))
+    if new_image:
+        enqueue_variants(cur, 'products', product_id, [image_path])
     mysql.connection.commit()
     cur.close()
+    _invalidate_products(product_id)
     flash('Product updated.', 'success')
     return redirect(url_for('store.admin_list'))
 
@@ -268,8 +504,13 @@ def admin_edit(product_id):
 @admin_required
 def admin_delete(product_id):
     cur = mysql.connection.cursor()
+    cur.execute('SELECT image_path FROM products WHERE id = %s FOR UPDATE', (product_id,))
+    product = cur.fetchone()
     cur.execute('DELETE FROM products WHERE id = %s', (product_id,))
+    if product:
+        release_uploads(cur, [product['image_path']])
     mysql.connection.commit()
     cur.close()
+    _invalidate_products(product_id)
     flash('Product deleted.', 'success')
     return redirect(url_for('store.admin_list'))
@@ -0,0 +1,107 @@
+# FarmIntel - Sales rollups: per day and per month totals by product, category and district
+from datetime import date
+import click
+import db
+
+DIMENSIONS = ('product', 'category', 'district')
+TABLES = ('sales_daily', 'sales_monthly')
+
+# Every order adds to exactly one district row, so summing a period's district rows gives the
+# period's order count, units and revenue without a separate (and contended) grand-total row
+_UPSERT = '''INSERT INTO {table} (period, dimension, dim_key, orders, units, revenue) VALUES (%s, %s, %s, %s, %s, %s)
+             ON DUPLICATE KEY UPDATE orders = orders + VALUES(orders), units = units + VALUES(units),
+                 revenue = revenue + VALUES(revenue)'''
+
+def record_order(cur, order_id, lines):
+    """Add one order to the rollups, inside the checkout transaction so they never drift.
+
+    ``lines`` are pricing.price_lines() lines (product_id, category, quantity, amount). Revenue is
+    before GST. Rows are written in key order, the same in every checkout, to avoid deadlocks.
+    """
+    cur.execute('''SELECT DATE(o.order_date) AS day, u.district FROM orders o JOIN users u ON u.id = o.farmer_id
+                   WHERE o.id = %s''', (order_id,))
+    row = cur.fetchone()
+    district = (row['district'] or '').strip()
+    totals = {}
+    for ln in lines:
+        for key in (('product', str(ln['product_id'])), ('category', ln.get('category') or ''), ('district', district)):
+            t = totals.setdefault(key, [1, 0, 0])
+            t[1] += ln['quantity']
+            t[2] += ln['amount']
+    for table, period in zip(TABLES, (row['day'], row['day'].replace(day=1))):
+        cur.executemany(_UPSERT.format(table=table),
+                        [(period, dim, key, *t) for (dim, key), t in sorted(totals.items())])
+
+def _rebuild(conn, since):
+    """Recompute every rollup row from ``since``'s month on from orders/order_items."""
+    since = since.replace(day=1)
+    cur = conn.cursor()
+    keys = {
+        'product': 'oi.product_id',
+        'category': "COALESCE(p.category, '')",
+        'district': "TRIM(COALESCE(u.district, ''))",
+    }
+    periods = {'sales_daily': 'DATE(o.order_date)', 'sales_monthly': "DATE_FORMAT(o.order_date, '%%Y-%%m-01')"}
+    try:
+        for table in TABLES:
+            cur.execute(f'DELETE FROM {table} WHERE period >= %s', (since,))
+            for dim in DIMENSIONS:
+                cur.execute(f'''INSERT INTO {table} (period, dimension, dim_key, orders, units, revenue)
+                                SELECT {periods[table]}, %s, {keys[dim]}, COUNT(DISTINCT o.id), SUM(oi.quantity),
+                                       SUM(oi.price_per_unit * oi.quantity)
+                                FROM orders o
+                                JOIN order_items oi ON oi.order_id = o.id
+                                JOIN users u ON u.id = o.farmer_id
+                                LEFT JOIN products p ON p.id = oi.product_id
+                                WHERE o.order_date >= %s
+                                GROUP BY 1, 3''', (dim, since))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def dashboard(cur, today=None):
+    """Numbers for the admin dashboard, read from the rollups only (a few dozen rows at most).
+    ``today`` defaults to the database's date: rollup periods are DATE(order_date) in the DB
+    session's time zone, which need not be the app server's."""
+    if today is None:
+        cur.execute('SELECT CURDATE() AS today')
+        today = cur.fetchone()['today']
+    month = today.replace(day=1)
+    totals = {}
+    for name, table, period in (('today', 'sales_daily', today), ('month', 'sales_monthly', month)):
+        cur.execute(f'''SELECT COALESCE(SUM(orders), 0) AS orders, COALESCE(SUM(units), 0) AS units,
+                               COALESCE(SUM(revenue), 0) AS revenue
+                        FROM {table} WHERE period = %s AND dimension = 'district' ''', (period,))
+        totals[name] = cur.fetchone()
+    cur.execute('''SELECT t.dim_key, p.name, t.units, t.revenue
+                   FROM (SELECT dim_key, units, revenue FROM sales_monthly
+                         WHERE period = %s AND dimension = 'product' ORDER BY revenue DESC LIMIT 5) t
+                   LEFT JOIN products p ON p.id = CAST(t.dim_key AS UNSIGNED)
+                   ORDER BY t.revenue DESC''', (month,))
+    top_products = cur.fetchall()
+    cur.execute('''SELECT dim_key, orders, units, revenue FROM sales_monthly
+                   WHERE period = %s AND dimension = 'category' ORDER BY revenue DESC''', (month,))
+    categories = cur.fetchall()
+    cur.execute('''SELECT dim_key, orders, units, revenue FROM sales_monthly
+                   WHERE period = %s AND dimension = 'district' ORDER BY revenue DESC LIMIT 5''', (month,))
+    districts = cur.fetchall()
+    return dict(totals, top_products=top_products, categories=categories, districts=districts)
+
+@click.command('sales-rollup')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Rebuild from this date\'s month on (default: all orders).')
+def sales_rollup_command(since):
+    """Rebuild the sales rollups from the orders (after migration 012, or to repair them).
+    Checkouts during the rebuild may be counted twice or missed, so run it while the store is quiet."""
+    conn = db.pool.acquire()
+    try:
+        _rebuild(conn, since.date() if since else date(2000, 1, 1))
+        click.echo('Sales rollups rebuilt')
+    finally:
+        db.pool.release(conn)
+
+def init_sales(app):
+    app.cli.add_command(sales_rollup_command)
@@ -0,0 +1,238 @@
+"""Checkout load test: many farmers race for the last units of one product.
+
+Creates a throwaway product with --stock units and --farmers farmer accounts, each with --qty of it
+in their cart. It then starts every checkout at once through the Flask app (--workers threads
+against MySQL). Afterwards it checks that stock never went negative and that the units sold match
+the orders placed. It then deletes the test data and rebuilds the sales rollups its orders were
+added to.
+
+Checkouts write real orders and sales rollups, so the script refuses to run unless MYSQL_DB names a
+dedicated test database (ending in ``_test``):
+
+    MYSQL_DB=farm_intel_test python scripts/checkout_load_test.py --farmers 300 --stock 100 --workers 32
+
+--ci runs a fixed, quick set of checks and exits non-zero on any failure, for CI against a test
+database. It includes a race forced deterministically between the cart check and the stock UPDATE,
+which fails if the ``stock >= CASE`` guard or the ``rowcount != len(ids)`` rollback is broken:
+
+    MYSQL_DB=farm_intel_test python scripts/checkout_load_test.py --ci
+"""
+import argparse
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import app
+import db
+from routes import store
+import sales
+
+def require_test_db():
+    name = app.config.get('MYSQL_DB', '')
+    if not name.endswith('_test'):
+        sys.exit(f"Refusing to run against MySQL database '{name}': checkouts write orders and sales rollups. "
+                 'Set MYSQL_DB to a dedicated test database whose name ends in _test.')
+
+def delete_test_data(conn, farmer_ids, product_ids):
+    """Delete the run's farmers and products (their orders, order lines and cart rows cascade), then
+    rebuild the sales rollups from the run's first order so its orders no longer count there."""
+    cur = conn.cursor()
+    cur.execute('SELECT MIN(order_date) AS first FROM orders WHERE farmer_id IN %s', (farmer_ids,))
+    first = cur.fetchone()['first']
+    cur.execute('DELETE FROM users WHERE id IN %s', (farmer_ids,))
+    cur.execute('DELETE FROM products WHERE id IN %s', (product_ids,))
+    conn.commit()
+    cur.close()
+    if first is not None:
+        sales._rebuild(conn, first.date())
+
+def setup(run, farmers, stock, qty):
+    conn = db.pool.acquire()
+    try:
+        cur = conn.cursor()
+        cur.execute('INSERT INTO products (name, category, price, stock) VALUES (%s, %s, %s, %s)',
+                    (f'Load test {run}', 'Fertilizers', 100, stock))
+        product_id = cur.lastrowid
+        cur.executemany('''INSERT INTO users (role, name, email, mobile, password_hash)
+                           VALUES ('farmer', %s, %s, '9000000000', '!')''',
+                        [(f'Load test {i}', f'loadtest-{run}-{i}@example.invalid') for i in range(farmers)])
+        cur.execute('SELECT id FROM users WHERE email LIKE %s', (f'loadtest-{run}-%',))
+        farmer_ids = [r['id'] for r in cur.fetchall()]
+        cur.executemany('INSERT INTO cart (farmer_id, product_id, quantity) VALUES (%s, %s, %s)',
+                        [(fid, product_id, qty) for fid in farmer_ids])
+        conn.commit()
+        cur.close()
+        return product_id, farmer_ids
+    finally:
+        db.pool.release(conn)
+
+def checkout(farmer_id, start):
+    client = app.test_client()
+    with client.session_transaction() as s:
+        s.update(logged_in=True, role='farmer', user_id=farmer_id, name='Load test', email='')
+    start.wait()
+    t0 = time.perf_counter()
+    resp = client.post('/store/checkout')
+    elapsed = time.perf_counter() - t0
+    if resp.status_code != 302:
+        return 'error', elapsed
+    return ('ordered' if resp.location.endswith('/store/orders') else 'rejected'), elapsed
+
+def verify_and_cleanup(farmer_ids, product_id, stock, qty, results):
+    conn = db.pool.acquire()
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT stock FROM products WHERE id = %s', (product_id,))
+        left = cur.fetchone()['stock']
+        cur.execute('SELECT COUNT(*) AS n, COALESCE(SUM(quantity), 0) AS sold FROM order_items WHERE product_id = %s', (product_id,))
+        row = cur.fetchone()
+        ordered = sum(1 for r, _ in results if r == 'ordered')
+        problems = []
+        if left < 0:
+            problems.append(f'stock went negative: {left}')
+        if int(row['sold']) != stock - left:
+            problems.append(f'{row["sold"]} units in order_items but stock dropped by {stock - left}')
+        if row['n'] != ordered:
+            problems.append(f'{ordered} checkouts succeeded but {row["n"]} order lines exist')
+        if ordered != min(len(results), stock // qty):
+            problems.append(f'{ordered} orders placed, expected {min(len(results), stock // qty)}')
+        cur.close()
+        delete_test_data(conn, farmer_ids, [product_id])
+        return left, problems
+    finally:
+        db.pool.release(conn)
+
+def interleaved_check(run):
+    """Two-product cart; between checkout's cart check and its stock UPDATE another buyer takes
+    most of product B. The whole order must be refused: no order, A's stock untouched, B not
+    negative, cart kept. Returns a list of problems."""
+    conn = db.pool.acquire()
+    try:
+        cur = conn.cursor()
+        ids = []
+        for name in ('A', 'B'):
+            cur.execute('INSERT INTO products (name, category, price, stock) VALUES (%s, %s, %s, %s)',
+                        (f'Load test {run} {name}', 'Fertilizers', 100, 5))
+            ids.append(cur.lastrowid)
+        cur.execute('''INSERT INTO users (role, name, email, mobile, password_hash)
+                       VALUES ('farmer', 'Load test race', %s, '9000000000', '!')''', (f'loadtest-{run}-race@example.invalid',))
+        farmer_id = cur.lastrowid
+        cur.executemany('INSERT INTO cart (farmer_id, product_id, quantity) VALUES (%s, %s, %s)',
+                        [(farmer_id, ids[0], 2), (farmer_id, ids[1], 3)])
+        conn.commit()
+    finally:
+        db.pool.release(conn)
+
+    original, calls = store._cart_items, []
+
+    def cart_items_then_sell(cur):
+        items = original(cur)
+        if not calls:  # only after the first read, the one checkout decides on
+            other = db.pool.acquire()
+            try:
+                c = other.cursor()
+                c.execute('UPDATE products SET stock = 1 WHERE id = %s', (ids[1],))
+                other.commit()
+                c.close()
+            finally:
+                db.pool.release(other)
+        calls.append(1)
+        return items
+
+    store._cart_items = cart_items_then_sell
+    try:
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess.update(logged_in=True, role='farmer', user_id=farmer_id, name='Load test', email='')
+        resp = client.post('/store/checkout')
+    finally:
+        store._cart_items = original
+
+    conn = db.pool.acquire()
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT id, stock FROM products WHERE id IN %s', (ids,))
+        stock = {r['id']: r['stock'] for r in cur.fetchall()}
+        cur.execute('SELECT COUNT(*) AS n FROM orders WHERE farmer_id = %s', (farmer_id,))
+        orders = cur.fetchone()['n']
+        cur.execute('SELECT COUNT(*) AS n FROM cart WHERE farmer_id = %s', (farmer_id,))
+        cart = cur.fetchone()['n']
+        problems = []
+        if resp.status_code != 302 or resp.location.endswith('/store/orders'):
+            problems.append(f'race: checkout answered {resp.status_code} {resp.location}, expected the cart page')
+        if stock[ids[0]] != 5:
+            problems.append(f'race: product A stock {stock[ids[0]]}, expected 5 (partial order not rolled back)')
+        if stock[ids[1]] != 1:
+            problems.append(f'race: product B stock {stock[ids[1]]}, expected 1 (stock guard missing)')
+        if orders:
+            problems.append(f'race: {orders} order(s) placed, expected none')
+        if cart != 2:
+            problems.append(f'race: {cart} cart line(s) left, expected 2')
+        cur.close()
+        delete_test_data(conn, [farmer_id], ids)
+        return problems
+    finally:
+        db.pool.release(conn)
+
+def load_run(farmers, stock, qty, workers):
+    """One concurrent run; returns (results, wall seconds, stock left, problems)."""
+    run = uuid.uuid4().hex[:8]
+    product_id, farmer_ids = setup(run, farmers, stock, qty)
+    start = threading.Barrier(min(workers, len(farmer_ids)))
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Barrier only lines up the first wave; later checkouts start as workers free up
+        futures = [pool.submit(checkout, fid, start if i < start.parties else threading.Barrier(1))
+                   for i, fid in enumerate(farmer_ids)]
+        results = [f.result() for f in futures]
+    wall = time.perf_counter() - t0
+    left, problems = verify_and_cleanup(farmer_ids, product_id, stock, qty, results)
+    errors = sum(1 for r, _ in results if r == 'error')
+    if errors:
+        problems.append(f'{errors} checkout(s) failed with an error')
+    return results, wall, left, problems
+
+def ci():
+    """Fixed quick checks for CI; exits 1 if any fails."""
+    problems = interleaved_check(uuid.uuid4().hex[:8])
+    for farmers, stock, qty in ((40, 15, 1), (30, 20, 3)):
+        problems += [f'load {farmers}x{qty} on {stock}: {p}' for p in load_run(farmers, stock, qty, 16)[3]]
+    for p in problems:
+        print('FAIL:', p)
+    if problems:
+        sys.exit(1)
+    print('OK: checkout never oversold (race and load checks)')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--farmers', type=int, default=300)
+    parser.add_argument('--stock', type=int, default=100)
+    parser.add_argument('--qty', type=int, default=1, help='units in each cart')
+    parser.add_argument('--workers', type=int, default=32, help='concurrent checkouts (keep near MYSQL_POOL_MAX)')
+    parser.add_argument('--ci', action='store_true', help='run the fixed CI checks instead (exit code 1 on failure)')
+    args = parser.parse_args()
+    require_test_db()
+    if args.ci:
+        ci()
+        return
+
+    results, wall, left, problems = load_run(args.farmers, args.stock, args.qty, args.workers)
+    times = sorted(t for _, t in results)
+    counts = {k: sum(1 for r, _ in results if r == k) for k in ('ordered', 'rejected', 'error')}
+    print(f'{len(results)} checkouts in {wall:.2f}s: {counts["ordered"]} ordered, {counts["rejected"]} rejected, '
+          f'{counts["error"]} errors; stock {args.stock} -> {left}')
+    print(f'latency p50 {times[len(times) // 2] * 1000:.0f} ms, p95 {times[int(len(times) * 0.95)] * 1000:.0f} ms, '
+          f'max {times[-1] * 1000:.0f} ms')
+    if problems:
+        for p in problems:
+            print('FAIL:', p)
+        sys.exit(1)
+    print('OK: no overselling')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+# FarmIntel - Read uploaded CSV / XLSX tables one row at a time (memory does not grow with file size)
+import csv
+import io
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # openpyxl missing: only CSV uploads are accepted
+    load_workbook = None
+
+class SpreadsheetError(Exception):
+    """The upload cannot be read as a table (wrong type, missing columns, damaged file)."""
+
+def extensions():
+    return ('csv', 'xlsx') if load_workbook else ('csv',)
+
+def column_name(header):
+    """'Nutrient Composition' / 'nutrient-composition' -> 'nutrient_composition'."""
+    return '_'.join(str(header or '').strip().lower().replace('-', ' ').split())
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))  # Excel stores every number as a float: 25 not '25.0'
+    return str(value).strip()
+
+def _csv_rows(f):
+    reader = csv.reader(io.TextIOWrapper(f.stream, encoding='utf-8-sig', newline=''))
+    for row in reader:
+        yield reader.line_num, row
+
+def _xlsx_rows(f):
+    if load_workbook is None:
+        raise SpreadsheetError('XLSX files need the openpyxl package; upload a CSV instead.')
+    try:
+        # read_only streams the sheet XML instead of building the whole workbook
+        wb = load_workbook(f.stream, read_only=True, data_only=True)
+    except Exception as e:
+        raise SpreadsheetError(f'Could not open the XLSX file ({e}).')
+    try:
+        for number, row in enumerate(wb.active.iter_rows(values_only=True), start=1):
+            yield number, row
+    finally:
+        wb.close()
+
+def iter_rows(f, required=()):
+    """Yield ``(row_number, {column: text})`` for every non-blank data row of an uploaded
+    FileStorage (.csv or .xlsx, header in the first row).
+
+    Column names are normalized with column_name(); cells are stripped strings ('' when empty).
+    Raises SpreadsheetError for an unsupported file or when a ``required`` column is missing.
+    """
+    ext = f.filename.rsplit('.', 1)[1].lower() if f.filename and '.' in f.filename else ''
+    if ext not in extensions():
+        raise SpreadsheetError(f'Upload a {" or ".join(e.upper() for e in extensions())} file.')
+    rows = _csv_rows(f) if ext == 'csv' else _xlsx_rows(f)
+    try:
+        _, header = next(rows)
+    except StopIteration:
+        raise SpreadsheetError('The file is empty.')
+    except UnicodeDecodeError:
+        raise SpreadsheetError('CSV files must be UTF-8 encoded.')
+    columns = [column_name(h) for h in header]
+    missing = [c for c in required if c not in columns]
+    if missing:
+        raise SpreadsheetError(f'Missing column(s): {", ".join(missing)}.')
+    try:
+        for number, row in rows:
+            values = [_text(v) for v in row]
+            if any(values):
+                yield number, dict(zip(columns, values + [''] * (len(columns) - len(values))))
+    except UnicodeDecodeError:
+        raise SpreadsheetError('CSV files must be UTF-8 encoded.')
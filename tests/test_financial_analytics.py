@@ -0,0 +1,117 @@
+# FarmIntel - analytics.json is cached per farmer and dropped when that farmer's records change
+# Run: python -m pytest tests/
+import pytest
+
+import db
+from app import app
+from catalog_cache import analytics, catalog
+
+SUMS = ('seeds_cost', 'fertilizer_cost', 'pesticides_cost', 'irrigation_cost', 'labour_cost',
+        'machinery_cost', 'other_expenses', 'total_expense', 'total_income', 'net_profit')
+
+class FakeCursor:
+    """Answers the few statements the financial routes send, from FakeDB.records."""
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.rowcount = 0
+
+    def execute(self, query, args=None):
+        sql = ' '.join(query.split())
+        self.rows = []
+        if sql.startswith('INSERT INTO financial_records'):
+            farmer_id, crop, season, *costs, production, price = args
+            costs = [float(c) for c in costs]
+            income = float(production) * float(price)
+            self.db.records.append(dict(zip(('farmer_id', 'crop_name', 'season') + SUMS,
+                                            [farmer_id, crop, season] + costs + [sum(costs), income, income - sum(costs)])))
+        elif sql.startswith('DELETE FROM financial_records'):
+            self.db.records.clear()
+        elif 'GROUP BY label' in sql:
+            mine = [r for r in self.db.records if r['farmer_id'] == args[0]]
+            if mine:
+                self.rows = [dict({'label': 'all', 'records': len(mine)},
+                                  **{k: sum(r[k] for r in mine) for k in SUMS})]
+        self.rowcount = len(self.rows)
+
+    def fetchall(self):
+        return list(self.rows)
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+class FakeDB:
+    def __init__(self):
+        self.records = []
+        self.queries = 0
+
+    def cursor(self, *args, **kwargs):
+        self.queries += 1
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def ping(self, reconnect=False):
+        pass
+
+    # Also stands in for the connection pool
+    def acquire(self):
+        return self
+
+    def release(self, conn):
+        pass
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(db, 'pool', fake)
+    monkeypatch.setattr(db, 'replica_pools', [])
+    monkeypatch.setattr(analytics, 'directory', tmp_path / 'analytics')
+    monkeypatch.setattr(catalog, 'directory', tmp_path / 'catalog')
+    analytics.clear()
+    app.config['TESTING'] = True
+    c = app.test_client()
+    with c.session_transaction() as s:
+        s.update(logged_in=True, role='farmer', user_id=7, name='Test', email='test@example.com')
+    c.fake = fake
+    yield c
+    analytics.clear()
+
+def _add(client, **fields):
+    form = dict({'crop_name': 'Wheat', 'season': 'Rabi', 'seeds_cost': '100'}, **fields)
+    assert client.post('/financial/add', data=form).status_code == 302
+
+def test_analytics_is_served_from_cache(client):
+    _add(client)
+    first = client.get('/financial/analytics.json').get_json()
+    queries = client.fake.queries
+    assert client.get('/financial/analytics.json').get_json() == first
+    assert client.fake.queries == queries
+
+def test_add_changes_next_response(client):
+    _add(client)
+    before = client.get('/financial/analytics.json').get_json()
+    assert before['totals']['records'] == 1
+    _add(client, seeds_cost='50', total_production='10', selling_price='20')
+    after = client.get('/financial/analytics.json').get_json()
+    assert after['totals']['records'] == 2
+    assert after['totals']['seeds_cost'] == 150
+    assert after['totals']['total_income'] == 200
+
+def test_delete_changes_next_response(client):
+    _add(client)
+    assert client.get('/financial/analytics.json').get_json()['totals']['records'] == 1
+    assert client.post('/financial/delete/1').status_code == 302
+    assert client.get('/financial/analytics.json').get_json()['totals']['records'] == 0
+
+def test_analytics_does_not_use_catalog_cache(client):
+    _add(client)
+    client.get('/financial/analytics.json')
+    assert not [k for k in catalog._data if k[0].startswith('financial')]
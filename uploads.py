@@ -0,0 +1,137 @@
+# FarmIntel - Content-addressed uploads: static/uploads/objects/<ab>/<sha256>.<ext>, reference counted
+import hashlib
+import os
+import tempfile
+import time
+from pathlib import Path
+import click
+from flask import request
+from config import Config
+import db
+import jobs
+
+OBJECTS_URL = '/static/uploads/objects/'
+_CHUNK = 64 * 1024
+
+def _static_dir():
+    return Path(Config.UPLOAD_FOLDER).parent
+
+def save_upload(cur, f):
+    """Store an uploaded FileStorage under its SHA-256 and take a reference to it.
+
+    Returns the path relative to ``static/`` (``uploads/objects/ab/ab12…ef.jpg``). The same
+    bytes uploaded again, for any crop or product, reuse the stored file and only bump
+    ``upload_objects.ref_count``; the reference is part of the caller's transaction.
+    """
+    folder = Path(Config.UPLOAD_OBJECTS_FOLDER)
+    folder.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix='.part')
+    try:
+        digest = hashlib.sha256()
+        with os.fdopen(fd, 'wb') as out:
+            for chunk in iter(lambda: f.stream.read(_CHUNK), b''):
+                digest.update(chunk)
+                out.write(chunk)
+            size = out.tell()
+        sha = digest.hexdigest()
+        ext = f.filename.rsplit('.', 1)[1].lower() if '.' in f.filename else 'bin'
+        rel = f'uploads/objects/{sha[:2]}/{sha}.{ext}'
+        # Reference first, file second: the row lock makes a concurrent cleanup of the same
+        # object finish (or wait for our commit) before the file is put in place
+        cur.execute('''INSERT INTO upload_objects (path, sha256, size) VALUES (%s, %s, %s)
+                       ON DUPLICATE KEY UPDATE ref_count = ref_count + 1''', (rel, sha, size))
+        dest = _static_dir() / rel
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        if dest.exists():
+            os.remove(tmp)
+            os.utime(dest)  # keeps a reused file inside uploads-gc's grace period
+        else:
+            os.replace(tmp, dest)
+        return rel
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+def release_uploads(cur, paths):
+    """Drop one reference to each stored path (legacy uploads outside objects/ are ignored).
+    Files whose count reaches zero are deleted by a 'release_uploads' job after the commit."""
+    paths = [p for p in paths if p and p.startswith('uploads/objects/')]
+    if not paths:
+        return
+    cur.executemany('UPDATE upload_objects SET ref_count = ref_count - 1 WHERE path = %s', [(p,) for p in paths])
+    jobs.enqueue(cur, 'release_uploads', {'paths': sorted(set(paths))})
+
+def _remove_object(rel):
+    path = _static_dir() / rel
+    for p in [path, *path.parent.glob(f'variants/{path.stem}.*')]:
+        try:
+            os.remove(p)
+        except FileNotFoundError:
+            pass
+
+def _collect(conn, paths):
+    """Delete unreferenced objects among ``paths``; returns how many were removed."""
+    cur = conn.cursor()
+    removed = 0
+    for rel in paths:
+        cur.execute('SELECT ref_count FROM upload_objects WHERE path = %s FOR UPDATE', (rel,))
+        row = cur.fetchone()
+        if row and row['ref_count'] <= 0:
+            _remove_object(rel)
+            cur.execute('DELETE FROM upload_objects WHERE path = %s', (rel,))
+            removed += 1
+        conn.commit()
+    cur.close()
+    return removed
+
+@jobs.handler('release_uploads')
+def release_uploads_job(conn, payload):
+    _collect(conn, payload['paths'])
+
+def _cache_headers(response):
+    # Object URLs never change content, so browsers may keep them without revalidating
+    if request.path.startswith(OBJECTS_URL) and response.status_code in (200, 304):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = Config.UPLOAD_CACHE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+@click.command('uploads-gc')
+@click.option('--grace', default=3600, show_default=True, help='Keep untracked files younger than this many seconds.')
+def uploads_gc_command(grace):
+    """Delete stored uploads that nothing references any more."""
+    conn = db.pool.acquire()
+    try:
+        cur = conn.cursor()
+        cur.execute('SELECT path FROM upload_objects WHERE ref_count <= 0')
+        removed = _collect(conn, [r['path'] for r in cur.fetchall()])
+        # Files left by requests that failed after saving the upload have no row at all
+        cur.execute('SELECT path FROM upload_objects')
+        known = {r['path'] for r in cur.fetchall()}
+        cur.close()
+        static = _static_dir()
+        cutoff = time.time() - grace
+        folder = Path(Config.UPLOAD_OBJECTS_FOLDER)
+        for path in folder.glob('*/*.*'):
+            rel = path.relative_to(static).as_posix()
+            if path.suffix != '.part' and rel not in known and path.stat().st_mtime < cutoff:
+                _remove_object(rel)
+                removed += 1
+        # Temp files of save_upload calls that crashed before the rename (they start in the root)
+        parts = 0
+        for path in [*folder.glob('*.part'), *folder.glob('*/*.part')]:
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    parts += 1
+            except FileNotFoundError:
+                pass
+        click.echo(f'{removed} object(s) removed, {parts} temporary file(s) removed')
+    finally:
+        db.pool.release(conn)
+
+def init_uploads(app):
+    app.after_request(_cache_headers)
+    app.cli.add_command(uploads_gc_command)